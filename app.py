@@ -1,52 +1,130 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import os
 import io
+import json
 import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Iterator, Tuple
 from services.conversation import ConversationManager
-from services.asr_service import ASRService
+from services.asr_service import ASRService, guess_mime
+from services.audio_preprocess import preprocess_audio
 from services.xtts_service import XTTSService, XTTSNotConfiguredError
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
-from services.storage import JSONStore
+from services.storage import open_user_store
+from services.audio_cache import UtteranceCache, utterance_key, finalize_streaming_wav
+from services.audio_codec import negotiate_format, encode as encode_audio, mime_type as audio_mime_type
+from services.prefetch import PromptPrefetcher
+from services.sessions import SessionCodec, open_session_store
+from services.turn_log import open_turn_log
+from services.metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 load_dotenv()
 
 
-def create_app() -> Flask:
+def create_app(asr_service: ASRService | None = None) -> Flask:
 	app = Flask(__name__, static_url_path='/static', static_folder='static')
 	CORS(app)
+	# Per-stage timers: Prometheus histograms on /metrics and a Server-Timing header per response
+	metrics = Metrics('app')
 
-	# Services
-	asr_service = ASRService()
+	# Services (an ASR service can be passed in, e.g. the fixed-latency stand-in used by benchmarks/)
+	if asr_service is None:
+		asr_service = ASRService()
+	asr_timeout = float(os.getenv('ASR_TIMEOUT', '60'))
+	asr_preprocess = os.getenv('ASR_PREPROCESS', '1').lower() not in ['0', 'false', 'no']
 	xtts_service = XTTSService()
 	conversation_manager = ConversationManager()
+	tts_cache = UtteranceCache()
+
+	def _prefetch_synthesize(text: str, voice_id: str) -> bytes:
+		with metrics.stage('xtts_prefetch'):
+			return xtts_service.synthesize_speech(text=text, voice_id=voice_id)
+
+	prefetcher = PromptPrefetcher(_prefetch_synthesize, tts_cache)
 
 	# Persistent stores
-	users_store = JSONStore(os.path.join('data', 'users.json'))
+	users_store = open_user_store('data')
+	turn_log = open_turn_log()
 
-	# In-memory session store
-	sessions = {}
+	# Session store (in-process LRU+TTL by default; SESSION_BACKEND=sqlite to share across workers)
+	sessions = open_session_store(
+		SessionCodec(conversation_manager.dump_state, conversation_manager.load_state),
+		on_evict=prefetcher.cancel,
+	)
+	metrics.gauge('sessions', 'Live sessions in the session store.', lambda: sessions.info()['sessions'])
+	metrics.gauge('tts_cache_memory_bytes', 'Bytes of synthesized audio held in memory.', lambda: tts_cache.info()['memory_bytes'])
+	metrics.gauge('tts_prefetch_inflight', 'Prompt syntheses queued or running ahead of playback.', lambda: prefetcher.info()['inflight'])
 
 	def _get_user(user_id: str | None) -> dict | None:
 		if not user_id:
 			return None
-		data = users_store.read()
-		return data.get('users', {}).get(user_id)
+		with metrics.stage('user_store'):
+			return users_store.get_user(user_id)
+
+	def _get_session(session_id: str | None) -> dict | None:
+		with metrics.stage('session_store'):
+			return sessions.get(session_id)
+
+	def _put_session(session_id: str, sess: dict) -> None:
+		with metrics.stage('session_store'):
+			sessions.put(session_id, sess)
+
+	def _prefetch(session_id: str, sess: dict) -> None:
+		# May plan dynamic prompts into sess['state']; callers persist the session afterwards
+		if not sess.get('voice_id') or not xtts_service.is_configured() or not prefetcher.enabled:
+			return
+		texts = conversation_manager.upcoming_prompts(sess['state'], prefetcher.ahead)
+		prefetcher.schedule(session_id, sess['voice_id'], texts)
+
+	def _unavailable(e: XTTSNotConfiguredError):
+		retry_after = getattr(e, 'retry_after', 0)
+		headers = {'Retry-After': str(max(1, int(round(retry_after))))} if retry_after else {}
+		return jsonify({"error": str(e)}), 503, headers
 
 	def _save_user(user: dict) -> None:
-		data = users_store.read()
-		users = data.get('users', {})
-		users[user['id']] = user
-		data['users'] = users
-		users_store.write(data)
+		with metrics.stage('user_store'):
+			users_store.save_user(user)
+
+	@app.before_request
+	def _start_timer():
+		g.timer = metrics.begin()
+
+	@app.after_request
+	def _finish_timer(response):
+		timer = g.pop('timer', None)
+		if timer is not None:
+			# Route templates keep label cardinality bounded; streamed bodies are timed to their first byte
+			route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+			response.headers['Server-Timing'] = metrics.end(timer, request.method, route, response.status_code)
+			# CORS is open, so let cross-origin pages read the timings too
+			response.headers['Timing-Allow-Origin'] = '*'
+		return response
+
+	@app.teardown_request
+	def _abort_timer(exc):
+		# after_request is skipped for unhandled exceptions; still count the request
+		timer = g.pop('timer', None)
+		if timer is not None:
+			route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+			metrics.end(timer, request.method, route, 500)
+
+	@app.get('/metrics')
+	def prometheus_metrics():
+		return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 	@app.get('/health')
 	def health():
 		return jsonify({
 			"status": "ok",
 			"xtts_configured": xtts_service.is_configured(),
+			"xtts": xtts_service.info(),
 			"asr_mode": asr_service.mode,
+			"asr": asr_service.stats(),
+			"tts_cache": tts_cache.info(),
+			"tts_prefetch": prefetcher.info(),
+			"sessions": sessions.info(),
 		})
 
 	@app.post('/auth/register')
@@ -56,10 +134,10 @@ def create_app() -> Flask:
 		password = payload.get('password') or ''
 		if not username or not password:
 			return jsonify({"error": "username and password required"}), 400
-		data = users_store.read()
-		for u in data.get('users', {}).values():
-			if u['username'] == username:
-				return jsonify({"error": "username exists"}), 409
+		with metrics.stage('user_store'):
+			taken = users_store.get_user_by_username(username)
+		if taken:
+			return jsonify({"error": "username exists"}), 409
 		user_id = str(uuid.uuid4())
 		user = {
 			"id": user_id,
@@ -68,7 +146,10 @@ def create_app() -> Flask:
 			"voices": [],
 			"default_voice_id": None,
 		}
-		_save_user(user)
+		with metrics.stage('user_store'):
+			created = users_store.create_user(user)
+		if not created:
+			return jsonify({"error": "username exists"}), 409
 		return jsonify({"user_id": user_id})
 
 	@app.post('/auth/login')
@@ -76,10 +157,10 @@ def create_app() -> Flask:
 		payload = request.json or {}
 		username = (payload.get('username') or '').strip().lower()
 		password = payload.get('password') or ''
-		data = users_store.read()
-		for u in data.get('users', {}).values():
-			if u['username'] == username and check_password_hash(u['password_hash'], password):
-				return jsonify({"user_id": u['id'], "default_voice_id": u.get('default_voice_id')})
+		with metrics.stage('user_store'):
+			u = users_store.get_user_by_username(username)
+		if u and check_password_hash(u['password_hash'], password):
+			return jsonify({"user_id": u['id'], "default_voice_id": u.get('default_voice_id')})
 		return jsonify({"error": "invalid credentials"}), 401
 
 	@app.get('/me')
@@ -100,13 +181,16 @@ def create_app() -> Flask:
 		u = _get_user(user_id)
 		if not u:
 			return jsonify({"error": "user not found"}), 404
-		voices = u.get('voices', [])
+		voices = []
 		found = False
-		for v in voices:
+		for v in u.get('voices', []):
 			if v['voice_id'] == voice_id:
+				if found:
+					# Drop duplicates left by earlier re-clones of the same recording
+					continue
 				v['name'] = name or v.get('name') or 'My Voice'
 				found = True
-				break
+			voices.append(v)
 		if not found:
 			voices.append({"voice_id": voice_id, "name": name or 'My Voice'})
 		u['voices'] = voices
@@ -129,14 +213,17 @@ def create_app() -> Flask:
 		session_id = payload.get('session_id')
 		user_id = payload.get('user_id')
 		voice_id = payload.get('voice_id')
-		if not session_id or session_id not in sessions:
+		sess = _get_session(session_id)
+		if not sess:
 			return jsonify({"error": "invalid session_id"}), 400
 		u = _get_user(user_id)
 		if not u:
 			return jsonify({"error": "user not found"}), 404
 		if voice_id and not any(v['voice_id'] == voice_id for v in u.get('voices', [])):
 			return jsonify({"error": "voice not found for user"}), 404
-		sessions[session_id]['voice_id'] = voice_id
+		sess['voice_id'] = voice_id
+		_prefetch(session_id, sess)
+		_put_session(session_id, sess)
 		return jsonify({"ok": True})
 
 	@app.post('/session')
@@ -147,11 +234,13 @@ def create_app() -> Flask:
 		u = _get_user(user_id)
 		if u:
 			default_voice_id = u.get('default_voice_id')
-		sessions[session_id] = {
+		sess = {
 			"voice_id": default_voice_id,
 			"state": conversation_manager.create_session_state(),
 			"user_id": user_id,
 		}
+		_prefetch(session_id, sess)
+		_put_session(session_id, sess)
 		first_prompt = conversation_manager.get_opening_prompt()
 		return jsonify({"session_id": session_id, "agent_text": first_prompt, "voice_id": default_voice_id})
 
@@ -168,42 +257,160 @@ def create_app() -> Flask:
 		temp_path = os.path.join('uploads', f"voice_{session_id or uuid.uuid4()}.wav")
 		file.save(temp_path)
 		try:
-			voice_id = xtts_service.clone_voice(temp_path)
-			if session_id and session_id in sessions:
-				sessions[session_id]['voice_id'] = voice_id
+			with metrics.stage('xtts'):
+				voice_id = xtts_service.clone_voice(temp_path)
+			sess = _get_session(session_id)
+			if sess:
+				sess['voice_id'] = voice_id
+				_prefetch(session_id, sess)
+				_put_session(session_id, sess)
 			# attach to user if provided
 			if user_id:
 				u = _get_user(user_id)
 				if u:
 					voices = u.get('voices', [])
-					voices.append({"voice_id": voice_id, "name": (voice_name or 'My Voice')})
+					# XTTS returns the existing voice_id when the same recording is cloned again
+					if not any(v['voice_id'] == voice_id for v in voices):
+						voices.append({"voice_id": voice_id, "name": (voice_name or 'My Voice')})
 					u['voices'] = voices
 					if not u.get('default_voice_id'):
 						u['default_voice_id'] = voice_id
 					_save_user(u)
 			return jsonify({"voice_id": voice_id})
 		except XTTSNotConfiguredError as e:
-			return jsonify({"error": str(e)}), 503
+			return _unavailable(e)
 		except Exception as e:
 			return jsonify({"error": f"voice cloning failed: {e}"}), 500
 
+	def _speech_chunks(voice_id: str, text: str) -> Iterator[bytes]:
+		"""Audio for text as an iterator of WAV bytes: cached/prefetched if available, else streamed from XTTS.
+
+		The upstream request is opened before returning so TTS errors surface to the caller; streamed
+		audio is cached once it has been relayed completely.
+		"""
+		cache_key = utterance_key(voice_id, text)
+		with metrics.stage('tts_cache'):
+			cached = tts_cache.get(cache_key)
+		if cached is None:
+			with metrics.stage('prefetch_wait'):
+				if prefetcher.wait(voice_id, text, timeout=120) is not None:
+					cached = tts_cache.get(cache_key)
+		if cached is not None:
+			return iter((cached,))
+		# Until the upstream response headers arrive; relaying the audio happens after ours are sent
+		with metrics.stage('xtts'):
+			chunks = xtts_service.stream_speech(text=text, voice_id=voice_id)
+
+		def _relay_and_cache():
+			parts = []
+			completed = False
+			try:
+				for chunk in chunks:
+					parts.append(chunk)
+					yield chunk
+				completed = True
+			finally:
+				if completed:
+					tts_cache.put(cache_key, finalize_streaming_wav(b''.join(parts)))
+
+		return _relay_and_cache()
+
+	def _encoded_speech(voice_id: str, text: str, fmt: str) -> bytes:
+		"""The whole utterance in fmt: cached or prefetched if available, else synthesized and encoded."""
+		cache_key = utterance_key(voice_id, text)
+		# Encoded variants are cached next to the WAV they were made from
+		variant_key = cache_key if fmt == 'wav' else f"{cache_key}.{fmt}"
+		with metrics.stage('tts_cache'):
+			body = tts_cache.get(variant_key) if fmt != 'wav' else None
+			wav_bytes = tts_cache.get(cache_key) if body is None else None
+		if body is not None:
+			return body
+		if wav_bytes is None:
+			with metrics.stage('prefetch_wait'):
+				if prefetcher.wait(voice_id, text, timeout=120) is not None:
+					wav_bytes = tts_cache.get(cache_key)
+		if wav_bytes is None:
+			with metrics.stage('xtts'):
+				wav_bytes = xtts_service.synthesize_speech(text=text, voice_id=voice_id)
+			tts_cache.put(cache_key, wav_bytes)
+		if fmt == 'wav':
+			return wav_bytes
+		with metrics.stage('encode'):
+			body = encode_audio(wav_bytes, fmt)
+		tts_cache.put(variant_key, body)
+		return body
+
+	def _asr_timed_out():
+		# The timeout's own message is empty; say what happened
+		return jsonify({"error": f"asr timed out after {asr_timeout:g} s"}), 504
+
+	def _transcribe_upload(file) -> Tuple[str, dict | None]:
+		"""Transcribe an uploaded recording; returns (text, audio preprocessing info or None)."""
+		orig_name = getattr(file, 'filename', '') or 'input.webm'
+		_, ext = os.path.splitext(orig_name)
+		if not ext:
+			ext = '.webm'
+		# Transcribe straight from the upload buffer; nothing is written to uploads/
+		audio_bytes = file.read()
+		mime_type = guess_mime(ext)
+		audio_info = None
+		if asr_preprocess:
+			with metrics.stage('asr_preprocess'):
+				prepared = preprocess_audio(audio_bytes)
+			if prepared is not None:
+				audio_info = {
+					"input_seconds": prepared.input_seconds,
+					"output_seconds": prepared.output_seconds,
+					"trimmed_seconds": round(prepared.trimmed_seconds, 3),
+				}
+				if prepared.is_silent:
+					return "", audio_info
+				audio_bytes, mime_type = prepared.data, prepared.mime_type
+		with metrics.stage('asr'):
+			text = asr_service.submit(audio_bytes, mime_type=mime_type).result(timeout=asr_timeout)
+		return text, audio_info
+
+	def _advance(session_id: str, sess: dict, user_text: str) -> dict:
+		with metrics.stage('handle_turn'):
+			result = conversation_manager.handle_turn(state=sess['state'], user_text=user_text)
+		sess['state'] = result['state']
+		if turn_log is not None and result.get('scored'):
+			turn_log.append(session_id, sess.get('user_id'), user_text, result['scored'])
+		if result['done']:
+			prefetcher.cancel(session_id)
+		else:
+			_prefetch(session_id, sess)
+		_put_session(session_id, sess)
+		return {
+			"agent_text": result['agent_text'],
+			"phase": result['phase'],
+			"scores": result['scores'],
+			"done": result['done'],
+		}
+
 	@app.post('/speak')
 	def speak():
 		data = request.form or request.json or {}
 		session_id = data.get('session_id')
 		text = data.get('text')
-		if not session_id or session_id not in sessions:
+		sess = _get_session(session_id)
+		if not sess:
 			return jsonify({"error": "invalid session_id"}), 400
 		if not text:
 			return jsonify({"error": "text is required"}), 400
-		voice_id = sessions[session_id]['voice_id']
+		voice_id = sess['voice_id']
 		if not voice_id:
 			return jsonify({"error": "voice not cloned yet"}), 400
+		stream = str(data.get('stream') or '').lower() in ['1', 'true', 'yes']
+		# Streaming playback decodes PCM as it arrives, so only whole-file responses are re-encoded
+		fmt = 'wav' if stream else negotiate_format(data.get('format'), request.headers.get('Accept'))
 		try:
-			wav_bytes = xtts_service.synthesize_speech(text=text, voice_id=voice_id)
-			return send_file(io.BytesIO(wav_bytes), mimetype='audio/wav', as_attachment=False, download_name='speech.wav')
+			if stream:
+				return Response(stream_with_context(_speech_chunks(voice_id, text)), mimetype='audio/wav', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-store'})
+			body = _encoded_speech(voice_id, text, fmt)
+			return send_file(io.BytesIO(body), mimetype=audio_mime_type(fmt), as_attachment=False, download_name=f'speech.{fmt}')
 		except XTTSNotConfiguredError as e:
-			return jsonify({"error": str(e)}), 503
+			return _unavailable(e)
 		except Exception as e:
 			return jsonify({"error": f"tts failed: {e}"}), 500
 
@@ -211,41 +418,66 @@ def create_app() -> Flask:
 	def asr():
 		if 'audio' not in request.files:
 			return jsonify({"error": "audio file required"}), 400
-		file = request.files['audio']
-		orig_name = getattr(file, 'filename', '') or 'input.webm'
-		_, ext = os.path.splitext(orig_name)
-		if not ext:
-			ext = '.webm'
-		os.makedirs('uploads', exist_ok=True)
-		temp_path = os.path.join('uploads', f"asr_{uuid.uuid4()}{ext}")
-		file.save(temp_path)
 		try:
-			text = asr_service.transcribe(temp_path)
-			return jsonify({"text": text})
+			text, audio_info = _transcribe_upload(request.files['audio'])
+			return jsonify({"text": text, "audio": audio_info})
+		except FutureTimeoutError:
+			return _asr_timed_out()
 		except Exception as e:
 			return jsonify({"error": f"asr failed: {e}"}), 500
-		finally:
-			try:
-				os.remove(temp_path)
-			except Exception:
-				pass
 
 	@app.post('/conversation/next')
 	def conversation_next():
 		payload = request.json or {}
 		session_id = payload.get('session_id')
 		user_text = payload.get('user_text', '')
-		if not session_id or session_id not in sessions:
+		sess = _get_session(session_id)
+		if not sess:
 			return jsonify({"error": "invalid session_id"}), 400
-		state = sessions[session_id]['state']
-		result = conversation_manager.handle_turn(state=state, user_text=user_text)
-		sessions[session_id]['state'] = result['state']
-		return jsonify({
-			"agent_text": result['agent_text'],
-			"phase": result['phase'],
-			"scores": result['scores'],
-			"done": result['done'],
-		})
+		return jsonify(_advance(session_id, sess, user_text))
+
+	@app.post('/conversation/turn')
+	def conversation_turn():
+		"""One patient turn in a single round trip: ASR, handle_turn and TTS of the next prompt.
+
+		Form fields: session_id, audio (recording; optional) or user_text, and format (speech format as
+		for /speak; optional). The response body is one line of JSON (transcript, agent_text, phase,
+		scores, done, audio info, whether speech follows and its speech_format) terminated by a
+		newline, then the agent's speech when available: a streamed WAV by default, or the whole
+		utterance in the requested compressed format.
+		"""
+		session_id = request.form.get('session_id')
+		sess = _get_session(session_id)
+		if not sess:
+			return jsonify({"error": "invalid session_id"}), 400
+		text, audio_info = request.form.get('user_text', ''), None
+		if 'audio' in request.files:
+			try:
+				text, audio_info = _transcribe_upload(request.files['audio'])
+			except FutureTimeoutError:
+				return _asr_timed_out()
+			except Exception as e:
+				return jsonify({"error": f"asr failed: {e}"}), 500
+		fmt = negotiate_format(request.form.get('format'))
+		turn = {"text": text, **_advance(session_id, sess, text), "audio": audio_info, "speech": False}
+		speech: Iterator[bytes] = iter(())
+		if sess['voice_id'] and turn['agent_text']:
+			try:
+				if fmt == 'wav':
+					speech = _speech_chunks(sess['voice_id'], turn['agent_text'])
+				else:
+					speech = iter((_encoded_speech(sess['voice_id'], turn['agent_text'], fmt),))
+				turn['speech'] = True
+				turn['speech_format'] = fmt
+			except Exception as e:
+				# The turn itself has been applied; report TTS failure in-band and return text only
+				turn['speech_error'] = f"tts failed: {e}"
+
+		def _body():
+			yield json.dumps(turn, separators=(',', ':')).encode('utf-8') + b'\n'
+			yield from speech
+
+		return Response(stream_with_context(_body()), mimetype='application/octet-stream', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-store'})
 
 	@app.get('/')
 	def index():
@@ -0,0 +1,539 @@
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+import anyio
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import UploadFile
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from services.conversation import ConversationManager
+from services.asr_service import ASRService, guess_mime
+from services.audio_preprocess import preprocess_audio
+from services.xtts_service import XTTSService, XTTSNotConfiguredError
+from services.storage import open_user_store
+from services.audio_cache import UtteranceCache, utterance_key, finalize_streaming_wav
+from services.audio_codec import negotiate_format, encode as encode_audio, mime_type as audio_mime_type
+from services.prefetch import PromptPrefetcher
+from services.sessions import MemorySessionStore, SessionCodec, open_session_store
+from services.turn_log import open_turn_log
+from services.metrics import Metrics, TimingMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+load_dotenv()
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+	yield data
+
+
+async def _nothing() -> AsyncIterator[bytes]:
+	return
+	yield
+
+
+async def _nothing_to_close() -> None:
+	return
+
+
+class _RelayResponse(StreamingResponse):
+	"""StreamingResponse that awaits on_close however the response ends.
+
+	A generator's finally never runs if the client disconnects before the first chunk is pulled, and
+	Starlette skips background tasks on a disconnect, so an upstream XTTS stream is closed here.
+	Otherwise its backend slot and pooled connection would stay held.
+	"""
+
+	def __init__(self, content: AsyncIterator[bytes], on_close: Callable[[], Awaitable[None]], **kwargs) -> None:
+		super().__init__(content, **kwargs)
+		self.on_close = on_close
+
+	async def __call__(self, scope, receive, send) -> None:
+		try:
+			await super().__call__(scope, receive, send)
+		finally:
+			# Shielded: a disconnect cancels the response, and the close must still run to completion
+			with anyio.CancelScope(shield=True):
+				await self.on_close()
+
+
+def create_async_app(asr_service: ASRService | None = None) -> FastAPI:
+	"""The routes of app.py served from an event loop (run with `uvicorn app_async:app`).
+
+	XTTS and Gemini ASR calls go through non-blocking clients, so a slow synthesis holds a socket
+	instead of a worker thread, and fast routes like /conversation/next never queue behind it.
+	Blocking or CPU-bound work (password hashing, handle_turn, audio preprocessing and encoding,
+	user-store and SQLite session I/O) runs in the threadpool. Prompt prefetching keeps its own
+	bounded thread pool. Same services, stores and environment variables as app.py, plus:
+	- ASYNC_THREADS: threadpool size for the blocking work above (default: 40)
+	"""
+	@asynccontextmanager
+	async def lifespan(app: FastAPI):
+		anyio.to_thread.current_default_thread_limiter().total_tokens = max(1, int(os.getenv('ASYNC_THREADS', '40')))
+		yield
+		await xtts_service.aclose()
+
+	app = FastAPI(title="Dementia Care Assistant", lifespan=lifespan)
+	# Per-stage timers: Prometheus histograms on /metrics and a Server-Timing header per response
+	metrics = Metrics('app')
+	app.add_middleware(TimingMiddleware, metrics=metrics, timing_allow_origin='*')
+	app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+	app.mount('/static', StaticFiles(directory=STATIC_DIR), name='static')
+
+	# Services
+	if asr_service is None:
+		asr_service = ASRService()
+	asr_timeout = float(os.getenv('ASR_TIMEOUT', '60'))
+	asr_preprocess = os.getenv('ASR_PREPROCESS', '1').lower() not in ['0', 'false', 'no']
+	xtts_service = XTTSService()
+	conversation_manager = ConversationManager()
+	tts_cache = UtteranceCache()
+
+	def _prefetch_synthesize(text: str, voice_id: str) -> bytes:
+		with metrics.stage('xtts_prefetch'):
+			return xtts_service.synthesize_speech(text=text, voice_id=voice_id)
+
+	prefetcher = PromptPrefetcher(_prefetch_synthesize, tts_cache)
+
+	# Persistent stores
+	users_store = open_user_store('data')
+	turn_log = open_turn_log()
+
+	sessions = open_session_store(
+		SessionCodec(conversation_manager.dump_state, conversation_manager.load_state),
+		on_evict=prefetcher.cancel,
+	)
+	# In-memory sessions are a dict lookup; the SQLite backend does real I/O and goes to the threadpool
+	offload_sessions = not isinstance(sessions, MemorySessionStore)
+	metrics.gauge('sessions', 'Live sessions in the session store.', lambda: sessions.info()['sessions'])
+	metrics.gauge('tts_cache_memory_bytes', 'Bytes of synthesized audio held in memory.', lambda: tts_cache.info()['memory_bytes'])
+	metrics.gauge('tts_prefetch_inflight', 'Prompt syntheses queued or running ahead of playback.', lambda: prefetcher.info()['inflight'])
+
+	def _error(message: str, status: int) -> JSONResponse:
+		return JSONResponse({"error": message}, status_code=status)
+
+	def _unavailable(e: XTTSNotConfiguredError) -> JSONResponse:
+		retry_after = getattr(e, 'retry_after', 0)
+		headers = {'Retry-After': str(max(1, int(round(retry_after))))} if retry_after else {}
+		return JSONResponse({"error": str(e)}, status_code=503, headers=headers)
+
+	async def _payload(request: Request):
+		"""JSON body or form fields, like `request.form or request.json` in app.py."""
+		content_type = request.headers.get('content-type', '')
+		if content_type.startswith('application/json'):
+			try:
+				return await request.json() or {}
+			except ValueError:
+				return {}
+		if content_type.startswith(('multipart/form-data', 'application/x-www-form-urlencoded')):
+			return await request.form()
+		return {}
+
+	async def _get_user(user_id: str | None) -> dict | None:
+		if not user_id:
+			return None
+		with metrics.stage('user_store'):
+			return await run_in_threadpool(users_store.get_user, user_id)
+
+	async def _save_user(user: dict) -> None:
+		with metrics.stage('user_store'):
+			await run_in_threadpool(users_store.save_user, user)
+
+	async def _get_session(session_id: str | None) -> dict | None:
+		with metrics.stage('session_store'):
+			if offload_sessions:
+				return await run_in_threadpool(sessions.get, session_id)
+			return sessions.get(session_id)
+
+	async def _put_session(session_id: str, sess: dict) -> None:
+		with metrics.stage('session_store'):
+			if offload_sessions:
+				await run_in_threadpool(sessions.put, session_id, sess)
+			else:
+				sessions.put(session_id, sess)
+
+	def _prefetch(session_id: str, sess: dict) -> None:
+		# May plan dynamic prompts into sess['state']; callers persist the session afterwards
+		if not sess.get('voice_id') or not xtts_service.is_configured() or not prefetcher.enabled:
+			return
+		texts = conversation_manager.upcoming_prompts(sess['state'], prefetcher.ahead)
+		prefetcher.schedule(session_id, sess['voice_id'], texts)
+
+	@app.get('/health')
+	async def health():
+		return {
+			"status": "ok",
+			"server": "async",
+			"xtts_configured": xtts_service.is_configured(),
+			"xtts": xtts_service.info(),
+			"asr_mode": asr_service.mode,
+			"asr": asr_service.stats(),
+			"tts_cache": tts_cache.info(),
+			"tts_prefetch": prefetcher.info(),
+			"sessions": await run_in_threadpool(sessions.info) if offload_sessions else sessions.info(),
+		}
+
+	@app.get('/metrics')
+	async def prometheus_metrics():
+		return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+	@app.post('/auth/register')
+	async def register(request: Request):
+		payload = await _payload(request)
+		username = (payload.get('username') or '').strip().lower()
+		password = payload.get('password') or ''
+		if not username or not password:
+			return _error("username and password required", 400)
+		with metrics.stage('user_store'):
+			taken = await run_in_threadpool(users_store.get_user_by_username, username)
+		if taken:
+			return _error("username exists", 409)
+		with metrics.stage('password_hash'):
+			password_hash = await run_in_threadpool(generate_password_hash, password)
+		user_id = str(uuid.uuid4())
+		user = {
+			"id": user_id,
+			"username": username,
+			"password_hash": password_hash,
+			"voices": [],
+			"default_voice_id": None,
+		}
+		with metrics.stage('user_store'):
+			created = await run_in_threadpool(users_store.create_user, user)
+		if not created:
+			return _error("username exists", 409)
+		return {"user_id": user_id}
+
+	@app.post('/auth/login')
+	async def login(request: Request):
+		payload = await _payload(request)
+		username = (payload.get('username') or '').strip().lower()
+		password = payload.get('password') or ''
+		with metrics.stage('user_store'):
+			u = await run_in_threadpool(users_store.get_user_by_username, username)
+		if u:
+			with metrics.stage('password_hash'):
+				valid = await run_in_threadpool(check_password_hash, u['password_hash'], password)
+			if valid:
+				return {"user_id": u['id'], "default_voice_id": u.get('default_voice_id')}
+		return _error("invalid credentials", 401)
+
+	@app.get('/me')
+	async def me(request: Request):
+		u = await _get_user(request.query_params.get('user_id'))
+		if not u:
+			return _error("not found", 404)
+		return {"id": u['id'], "username": u['username'], "voices": u['voices'], "default_voice_id": u['default_voice_id']}
+
+	@app.post('/voices/name')
+	async def name_voice(request: Request):
+		payload = await _payload(request)
+		voice_id = payload.get('voice_id')
+		name = (payload.get('name') or '').strip()
+		set_default = bool(payload.get('set_default'))
+		u = await _get_user(payload.get('user_id'))
+		if not u:
+			return _error("user not found", 404)
+		voices = []
+		found = False
+		for v in u.get('voices', []):
+			if v['voice_id'] == voice_id:
+				if found:
+					# Drop duplicates left by earlier re-clones of the same recording
+					continue
+				v['name'] = name or v.get('name') or 'My Voice'
+				found = True
+			voices.append(v)
+		if not found:
+			voices.append({"voice_id": voice_id, "name": name or 'My Voice'})
+		u['voices'] = voices
+		if set_default:
+			u['default_voice_id'] = voice_id
+		await _save_user(u)
+		return {"ok": True, "voices": voices, "default_voice_id": u.get('default_voice_id')}
+
+	@app.get('/voices')
+	async def list_voices(request: Request):
+		u = await _get_user(request.query_params.get('user_id'))
+		if not u:
+			return _error("user not found", 404)
+		return {"voices": u.get('voices', []), "default_voice_id": u.get('default_voice_id')}
+
+	@app.post('/voices/select')
+	async def select_voice(request: Request):
+		payload = await _payload(request)
+		session_id = payload.get('session_id')
+		voice_id = payload.get('voice_id')
+		sess = await _get_session(session_id)
+		if not sess:
+			return _error("invalid session_id", 400)
+		u = await _get_user(payload.get('user_id'))
+		if not u:
+			return _error("user not found", 404)
+		if voice_id and not any(v['voice_id'] == voice_id for v in u.get('voices', [])):
+			return _error("voice not found for user", 404)
+		sess['voice_id'] = voice_id
+		_prefetch(session_id, sess)
+		await _put_session(session_id, sess)
+		return {"ok": True}
+
+	@app.post('/session')
+	async def create_session(request: Request):
+		payload = await _payload(request)
+		user_id = payload.get('user_id')
+		session_id = str(uuid.uuid4())
+		u = await _get_user(user_id)
+		default_voice_id = u.get('default_voice_id') if u else None
+		sess = {
+			"voice_id": default_voice_id,
+			"state": conversation_manager.create_session_state(),
+			"user_id": user_id,
+		}
+		_prefetch(session_id, sess)
+		await _put_session(session_id, sess)
+		return {"session_id": session_id, "agent_text": conversation_manager.get_opening_prompt(), "voice_id": default_voice_id}
+
+	@app.post('/voice/clone')
+	async def clone_voice(request: Request):
+		form = await request.form()
+		session_id = form.get('session_id')
+		user_id = form.get('user_id')
+		voice_name = form.get('voice_name')
+		upload = form.get('audio')
+		if not isinstance(upload, UploadFile):
+			return _error("audio file required (1–3 min)", 400)
+		try:
+			# Sent from memory; unlike app.py nothing is written to uploads/
+			audio = await upload.read()
+			with metrics.stage('xtts'):
+				voice_id = await xtts_service.aclone_voice(audio, upload.filename or 'voice.wav')
+			sess = await _get_session(session_id)
+			if sess:
+				sess['voice_id'] = voice_id
+				_prefetch(session_id, sess)
+				await _put_session(session_id, sess)
+			if user_id:
+				u = await _get_user(user_id)
+				if u:
+					voices = u.get('voices', [])
+					# XTTS returns the existing voice_id when the same recording is cloned again
+					if not any(v['voice_id'] == voice_id for v in voices):
+						u['voices'] = [*voices, {"voice_id": voice_id, "name": (voice_name or 'My Voice')}]
+					if not u.get('default_voice_id'):
+						u['default_voice_id'] = voice_id
+					await _save_user(u)
+			return {"voice_id": voice_id}
+		except XTTSNotConfiguredError as e:
+			return _unavailable(e)
+		except Exception as e:
+			return _error(f"voice cloning failed: {e}", 500)
+
+	async def _cache_get(key: str) -> bytes | None:
+		# A memory miss falls through to a disk read
+		return await run_in_threadpool(tts_cache.get, key)
+
+	async def _speech_chunks(voice_id: str, text: str) -> Tuple[AsyncIterator[bytes], Callable[[], Awaitable[None]]]:
+		"""Async _speech_chunks of app.py: cached/prefetched audio if available, else relayed from XTTS.
+
+		The upstream request is opened before returning so TTS errors surface to the caller. Also
+		returns the callback that closes it, for _RelayResponse.
+		"""
+		cache_key = utterance_key(voice_id, text)
+		with metrics.stage('tts_cache'):
+			cached = await _cache_get(cache_key)
+		if cached is None:
+			with metrics.stage('prefetch_wait'):
+				if await prefetcher.wait_async(voice_id, text, timeout=120) is not None:
+					cached = await _cache_get(cache_key)
+		if cached is not None:
+			return _once(cached), _nothing_to_close
+		with metrics.stage('xtts'):
+			body = await xtts_service.astream_speech(text=text, voice_id=voice_id)
+
+		async def _relay_and_cache():
+			parts = []
+			async for chunk in body:
+				parts.append(chunk)
+				yield chunk
+			await run_in_threadpool(tts_cache.put, cache_key, finalize_streaming_wav(b''.join(parts)))
+
+		return _relay_and_cache(), body.aclose
+
+	async def _encoded_speech(voice_id: str, text: str, fmt: str) -> bytes:
+		"""Async _encoded_speech of app.py: the whole utterance in fmt."""
+		cache_key = utterance_key(voice_id, text)
+		# Encoded variants are cached next to the WAV they were made from
+		variant_key = cache_key if fmt == 'wav' else f"{cache_key}.{fmt}"
+		with metrics.stage('tts_cache'):
+			body = await _cache_get(variant_key) if fmt != 'wav' else None
+			wav_bytes = await _cache_get(cache_key) if body is None else None
+		if body is not None:
+			return body
+		if wav_bytes is None:
+			with metrics.stage('prefetch_wait'):
+				if await prefetcher.wait_async(voice_id, text, timeout=120) is not None:
+					wav_bytes = await _cache_get(cache_key)
+		if wav_bytes is None:
+			with metrics.stage('xtts'):
+				wav_bytes = await xtts_service.asynthesize_speech(text=text, voice_id=voice_id)
+			await run_in_threadpool(tts_cache.put, cache_key, wav_bytes)
+		if fmt == 'wav':
+			return wav_bytes
+		with metrics.stage('encode'):
+			body = await run_in_threadpool(encode_audio, wav_bytes, fmt)
+		await run_in_threadpool(tts_cache.put, variant_key, body)
+		return body
+
+	def _asr_timed_out() -> JSONResponse:
+		return _error(f"asr timed out after {asr_timeout:g} s", 504)
+
+	async def _transcribe_upload(upload: UploadFile) -> Tuple[str, dict | None]:
+		_, ext = os.path.splitext(upload.filename or 'input.webm')
+		audio_bytes = await upload.read()
+		mime_type = guess_mime(ext or '.webm')
+		audio_info = None
+		if asr_preprocess:
+			with metrics.stage('asr_preprocess'):
+				prepared = await run_in_threadpool(preprocess_audio, audio_bytes)
+			if prepared is not None:
+				audio_info = {
+					"input_seconds": prepared.input_seconds,
+					"output_seconds": prepared.output_seconds,
+					"trimmed_seconds": round(prepared.trimmed_seconds, 3),
+				}
+				if prepared.is_silent:
+					return "", audio_info
+				audio_bytes, mime_type = prepared.data, prepared.mime_type
+		with metrics.stage('asr'):
+			text = await asyncio.wait_for(asr_service.atranscribe(audio_bytes, mime_type=mime_type), asr_timeout)
+		return text, audio_info
+
+	async def _advance(session_id: str, sess: dict, user_text: str) -> dict:
+		def _apply() -> dict:
+			# Scoring and prefetch planning are CPU work; one threadpool hop covers both
+			with metrics.stage('handle_turn'):
+				result = conversation_manager.handle_turn(state=sess['state'], user_text=user_text)
+			sess['state'] = result['state']
+			if turn_log is not None and result.get('scored'):
+				turn_log.append(session_id, sess.get('user_id'), user_text, result['scored'])
+			if result['done']:
+				prefetcher.cancel(session_id)
+			else:
+				_prefetch(session_id, sess)
+			return result
+
+		result = await run_in_threadpool(_apply)
+		await _put_session(session_id, sess)
+		return {
+			"agent_text": result['agent_text'],
+			"phase": result['phase'],
+			"scores": result['scores'],
+			"done": result['done'],
+		}
+
+	@app.post('/speak')
+	async def speak(request: Request):
+		data = await _payload(request)
+		session_id = data.get('session_id')
+		text = data.get('text')
+		sess = await _get_session(session_id)
+		if not sess:
+			return _error("invalid session_id", 400)
+		if not text:
+			return _error("text is required", 400)
+		voice_id = sess['voice_id']
+		if not voice_id:
+			return _error("voice not cloned yet", 400)
+		stream = str(data.get('stream') or '').lower() in ['1', 'true', 'yes']
+		# Streaming playback decodes PCM as it arrives, so only whole-file responses are re-encoded
+		fmt = 'wav' if stream else negotiate_format(data.get('format'), request.headers.get('accept'))
+		try:
+			if stream:
+				chunks, close = await _speech_chunks(voice_id, text)
+				return _RelayResponse(chunks, close, media_type='audio/wav', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-store'})
+			body = await _encoded_speech(voice_id, text, fmt)
+			return Response(body, media_type=audio_mime_type(fmt), headers={'Content-Disposition': f'inline; filename="speech.{fmt}"'})
+		except XTTSNotConfiguredError as e:
+			return _unavailable(e)
+		except Exception as e:
+			return _error(f"tts failed: {e}", 500)
+
+	@app.post('/asr')
+	async def asr(request: Request):
+		upload = (await request.form()).get('audio')
+		if not isinstance(upload, UploadFile):
+			return _error("audio file required", 400)
+		try:
+			text, audio_info = await _transcribe_upload(upload)
+			return {"text": text, "audio": audio_info}
+		except asyncio.TimeoutError:
+			return _asr_timed_out()
+		except Exception as e:
+			return _error(f"asr failed: {e}", 500)
+
+	@app.post('/conversation/next')
+	async def conversation_next(request: Request):
+		payload = await _payload(request)
+		session_id = payload.get('session_id')
+		sess = await _get_session(session_id)
+		if not sess:
+			return _error("invalid session_id", 400)
+		return await _advance(session_id, sess, payload.get('user_text', ''))
+
+	@app.post('/conversation/turn')
+	async def conversation_turn(request: Request):
+		"""One patient turn in a single round trip; same wire format as /conversation/turn in app.py."""
+		form = await request.form()
+		session_id = form.get('session_id')
+		sess = await _get_session(session_id)
+		if not sess:
+			return _error("invalid session_id", 400)
+		text, audio_info = form.get('user_text', ''), None
+		upload = form.get('audio')
+		if isinstance(upload, UploadFile):
+			try:
+				text, audio_info = await _transcribe_upload(upload)
+			except asyncio.TimeoutError:
+				return _asr_timed_out()
+			except Exception as e:
+				return _error(f"asr failed: {e}", 500)
+		fmt = negotiate_format(form.get('format'))
+		turn = {"text": text, **await _advance(session_id, sess, text), "audio": audio_info, "speech": False}
+		speech: AsyncIterator[bytes] = _nothing()
+		close_speech: Callable[[], Awaitable[None]] = _nothing_to_close
+		if sess['voice_id'] and turn['agent_text']:
+			try:
+				if fmt == 'wav':
+					speech, close_speech = await _speech_chunks(sess['voice_id'], turn['agent_text'])
+				else:
+					speech = _once(await _encoded_speech(sess['voice_id'], turn['agent_text'], fmt))
+				turn['speech'] = True
+				turn['speech_format'] = fmt
+			except Exception as e:
+				# The turn itself has been applied; report TTS failure in-band and return text only
+				turn['speech_error'] = f"tts failed: {e}"
+
+		async def _body():
+			yield json.dumps(turn, separators=(',', ':')).encode('utf-8') + b'\n'
+			async for chunk in speech:
+				yield chunk
+
+		return _RelayResponse(_body(), close_speech, media_type='application/octet-stream', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-store'})
+
+	@app.get('/')
+	async def index():
+		return FileResponse(os.path.join(STATIC_DIR, 'index.html'))
+
+	return app
+
+
+app = create_async_app()
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from services.asr_service import ASRService, AudioInput, _read_audio
+from services.audio_codec import DEFAULT_SR, mime_type as audio_mime_type, streaming_wav_header, wav_from_pcm
+
+
+class FakeXTTSServer:
+	"""Local stand-in for xtts_server.py with configurable latency and no model.
+
+	Speaks the same protocol XTTSService uses (/health, /clone, /tts with format, /tts/stream).
+	Each synthesis sleeps latency_ms + ms_per_char * len(text) and returns silence lasting
+	audio_s_per_char * len(text) at 24 kHz. Every clone returns a new voice_id, so sessions don't
+	share cached audio.
+	"""
+
+	def __init__(self, latency_ms: float = 150.0, ms_per_char: float = 1.0, clone_ms: float = 50.0, audio_s_per_char: float = 0.06) -> None:
+		self.latency_s = latency_ms / 1000.0
+		self.per_char_s = ms_per_char / 1000.0
+		self.clone_s = clone_ms / 1000.0
+		self.audio_s_per_char = audio_s_per_char
+		self.requests: Counter = Counter()
+		self._ids = itertools.count(1)
+		self._lock = threading.Lock()
+		self._server: Optional[ThreadingHTTPServer] = None
+
+	@property
+	def url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def start(self) -> str:
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def log_message(self, *args: Any) -> None:
+				pass
+
+			def _send(self, status: int, body: bytes, content_type: str) -> None:
+				self.send_response(status)
+				self.send_header('Content-Type', content_type)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def do_GET(self) -> None:
+				fake._count(self.path)
+				self._send(200, b'{"status": "ok"}', 'application/json')
+
+			def do_POST(self) -> None:
+				fake._count(self.path)
+				body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+				if self.path == '/clone':
+					time.sleep(fake.clone_s)
+					self._send(200, json.dumps({"voice_id": f"bench-{next(fake._ids)}", "deduplicated": False}).encode('utf-8'), 'application/json')
+					return
+				req = json.loads(body or b'{}')
+				text = req.get('text') or ''
+				pcm = fake._synthesize(text)
+				if self.path == '/tts/stream':
+					# Streaming WAV header first, as xtts_server sends it, then the samples
+					header = streaming_wav_header()
+					self._send(200, header + pcm, 'audio/wav')
+				elif req.get('format') == 'pcm':
+					self._send(200, pcm, audio_mime_type('pcm'))
+				else:
+					self._send(200, wav_from_pcm(pcm), 'audio/wav')
+
+		self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self._server.daemon_threads = True
+		threading.Thread(target=self._server.serve_forever, name='fake-xtts', daemon=True).start()
+		return self.url
+
+	def stop(self) -> None:
+		if self._server is not None:
+			self._server.shutdown()
+			self._server.server_close()
+
+	def _count(self, path: str) -> None:
+		with self._lock:
+			self.requests[path] += 1
+
+	def _synthesize(self, text: str) -> bytes:
+		time.sleep(self.latency_s + self.per_char_s * len(text))
+		return b'\0\0' * int(DEFAULT_SR * self.audio_s_per_char * len(text))
+
+
+class FakeASRService(ASRService):
+	"""ASRService whose "recordings" are the answer text itself, transcribed after latency_ms.
+
+	Keeps the real submit() pool (ASR_WORKERS), so queueing behaves as it does in production.
+	"""
+
+	def __init__(self, latency_ms: float = 300.0) -> None:
+		super().__init__()
+		self.mode = 'fake'
+		self.latency_s = latency_ms / 1000.0
+
+	def transcribe(self, audio: AudioInput, mime_type: Optional[str] = None) -> str:
+		time.sleep(self.latency_s)
+		data, _ = _read_audio(audio, mime_type)
+		return bytes(data).decode('utf-8', errors='replace').strip()
+
+	async def atranscribe(self, audio: AudioInput, mime_type: Optional[str] = None) -> str:
+		# Waits like a remote API call: no pool thread is held
+		await asyncio.sleep(self.latency_s)
+		data, _ = _read_audio(audio, mime_type)
+		return bytes(data).decode('utf-8', errors='replace').strip()
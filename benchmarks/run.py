@@ -0,0 +1,289 @@
+"""Load and latency benchmarks for the Flask or async app, plus storage and scoring micro-benchmarks.
+
+The app is built with create_app() (or create_async_app() under uvicorn with --server async)
+against a local FakeXTTSServer and a FakeASRService (see benchmarks/fakes.py), so runs need no
+model, GPU or network and are comparable over time. Each concurrency level drives scripted full assessments (/session, /voice/clone, then /speak, /asr and
+/conversation/next per turn) and reports throughput and p50/p95/p99 latency per endpoint.
+Results are written as JSON (--out); a short summary goes to stderr.
+
+	python benchmarks/run.py --concurrency 1,4,16 --out bench.json
+	python benchmarks/run.py --server async --concurrency 16,256 --skip-micro
+	python benchmarks/run.py --skip-load --store-sizes 10000,100000
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fakes import FakeASRService, FakeXTTSServer  # noqa: E402
+from services.conversation import ConversationManager  # noqa: E402
+from services.storage import JSONStore, JSONUserStore  # noqa: E402
+
+# Patient answers cycled through each assessment; each session starts at a different offset
+ANSWERS = [
+	'apple table penny', 'Monday', 'May', 'Pune', 'summer', '7 2 9 4 6', '93', '86', 'yes',
+	'I went to the market and bought bread and milk', 'no', 'buy tickets and pack bags', 'apple penny',
+]
+MAX_TURNS = 60
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+	ms = np.asarray(samples) * 1000.0
+	p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+	return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2), "mean_ms": round(float(ms.mean()), 2), "max_ms": round(float(ms.max()), 2)}
+
+
+class _Recorder:
+	def __init__(self) -> None:
+		self.latencies: Dict[str, List[float]] = defaultdict(list)
+		self.errors: Dict[str, int] = defaultdict(int)
+		self._lock = threading.Lock()
+
+	def call(self, http: requests.Session, endpoint: str, url: str, **kwargs: Any) -> requests.Response:
+		started = time.perf_counter()
+		resp = http.post(url, timeout=300, **kwargs)
+		_ = resp.content  # include body transfer
+		elapsed = time.perf_counter() - started
+		with self._lock:
+			self.latencies[endpoint].append(elapsed)
+			if resp.status_code >= 400:
+				self.errors[endpoint] += 1
+		return resp
+
+
+def _assessment(base: str, rec: _Recorder, offset: int) -> int:
+	"""One scripted assessment from /session to the summary; returns the number of turns."""
+	with requests.Session() as http:
+		resp = rec.call(http, '/session', f"{base}/session", json={})
+		session_id, agent_text = resp.json()['session_id'], resp.json()['agent_text']
+		rec.call(http, '/voice/clone', f"{base}/voice/clone", data={"session_id": session_id}, files={"audio": ('sample.wav', b'RIFF' + b'\0' * 4096)})
+		for turn in range(MAX_TURNS):
+			rec.call(http, '/speak', f"{base}/speak", data={"session_id": session_id, "text": agent_text})
+			answer = ANSWERS[(offset + turn) % len(ANSWERS)]
+			# FakeASRService transcribes the uploaded bytes as text
+			text = rec.call(http, '/asr', f"{base}/asr", files={"audio": ('answer.webm', answer.encode('utf-8'))}).json().get('text', '')
+			result = rec.call(http, '/conversation/next', f"{base}/conversation/next", json={"session_id": session_id, "user_text": text}).json()
+			agent_text = result['agent_text']
+			if result['done']:
+				rec.call(http, '/speak', f"{base}/speak", data={"session_id": session_id, "text": agent_text})
+				return turn + 1
+	return MAX_TURNS
+
+
+def _serve(app) -> Tuple[Callable[[], None], str]:
+	from werkzeug.serving import make_server
+	server = make_server('127.0.0.1', 0, app, threaded=True)
+	threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+	return server.shutdown, f"http://127.0.0.1:{server.server_port}"
+
+
+def _serve_async(app) -> Tuple[Callable[[], None], str]:
+	import socket
+	import uvicorn
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.bind(('127.0.0.1', 0))
+	server = uvicorn.Server(uvicorn.Config(app, log_level='warning', backlog=4096))
+	thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name='bench-app', daemon=True)
+	thread.start()
+	while not server.started and thread.is_alive():
+		time.sleep(0.01)
+
+	def stop() -> None:
+		server.should_exit = True
+		thread.join()
+		sock.close()
+	return stop, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def run_load(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+	fake_xtts = FakeXTTSServer(args.xtts_latency_ms, args.xtts_ms_per_char, args.clone_latency_ms)
+	os.environ['XTTS_BASE_URL'] = fake_xtts.start()
+	# Fake recordings are not audio; the stand-in ASR reads them as text
+	os.environ['ASR_PREPROCESS'] = '0'
+	os.environ['ASR_BACKEND'] = 'stub'
+	os.environ.setdefault('TTS_CACHE_DIR', os.path.join(workdir, 'cache', 'tts'))
+	os.environ.setdefault('USER_STORE_PATH', os.path.join(workdir, 'users.db'))
+	logging.getLogger('werkzeug').setLevel(logging.ERROR)
+	if args.server == 'async':
+		from app_async import create_async_app as create
+		serve = _serve_async
+	else:
+		from app import create_app as create
+		serve = _serve
+	levels = []
+	for concurrency in args.concurrency:
+		# A fresh app per level so caches, sessions and prefetch queues start cold
+		stop, base = serve(create(asr_service=FakeASRService(args.asr_latency_ms)))
+		rec = _Recorder()
+		n_sessions = concurrency * args.sessions_per_worker
+		started = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=concurrency) as pool:
+			turns = list(pool.map(lambda i: _assessment(base, rec, i), range(n_sessions)))
+		elapsed = time.perf_counter() - started
+		stop()
+		total = sum(len(v) for v in rec.latencies.values())
+		levels.append({
+			"concurrency": concurrency,
+			"assessments": n_sessions,
+			"turns": sum(turns),
+			"elapsed_s": round(elapsed, 3),
+			"requests_per_s": round(total / elapsed, 2),
+			"assessments_per_s": round(n_sessions / elapsed, 3),
+			"endpoints": {
+				endpoint: {"requests": len(samples), "errors": rec.errors[endpoint], "requests_per_s": round(len(samples) / elapsed, 2), **_percentiles(samples)}
+				for endpoint, samples in sorted(rec.latencies.items())
+			},
+		})
+		print(f"[load] concurrency={concurrency}: {n_sessions} assessments in {elapsed:.1f}s, {total / elapsed:.1f} req/s", file=sys.stderr)
+	fake_xtts.stop()
+	return {"levels": levels, "xtts_requests": dict(fake_xtts.requests)}
+
+
+def _users(n: int) -> Dict[str, Any]:
+	pw = 'pbkdf2:sha256:600000$' + 'x' * 16 + '$' + '0' * 64
+	users = {}
+	for i in range(n):
+		uid = f"{i:08d}-0000-4000-8000-000000000000"
+		users[uid] = {"id": uid, "username": f"user{i}", "password_hash": pw, "voices": [{"voice_id": f"v{i}", "name": "My Voice"}], "default_voice_id": f"v{i}"}
+	return {"users": users}
+
+
+def _timed(fn, repeat: int) -> float:
+	"""Median seconds per call over repeat calls."""
+	samples = []
+	for _ in range(repeat):
+		started = time.perf_counter()
+		fn()
+		samples.append(time.perf_counter() - started)
+	return statistics.median(samples)
+
+
+def bench_json_store(sizes: List[int], workdir: str) -> List[Dict[str, Any]]:
+	out = []
+	for n in sizes:
+		path = os.path.join(workdir, f"store_{n}", 'users.json')
+		doc = _users(n)
+		store = JSONStore(path, flush_ms=0)
+		repeat = 3 if n < 1_000_000 else 1
+		write_s = _timed(lambda: store.write(doc), repeat)
+		cold_read_s = _timed(lambda: JSONStore(path, flush_ms=0).read(), repeat)
+		warm_read_s = _timed(store.read, 1000)
+		# save_user is copy-on-write over the whole document; the coalesced flush is measured above
+		user_store = JSONUserStore(path)
+		user_store.store.flush_s = 3600.0
+		user = user_store.get_user(next(iter(doc['users'])))
+		save_user_s = _timed(lambda: user_store.save_user(user), repeat * 3)
+		user_store.store.flush()
+		out.append({
+			"users": n,
+			"file_bytes": os.path.getsize(path),
+			"write_ms": round(write_s * 1000, 2),
+			"cold_read_ms": round(cold_read_s * 1000, 2),
+			"warm_read_us": round(warm_read_s * 1e6, 3),
+			"save_user_ms": round(save_user_s * 1000, 3),
+		})
+		print(f"[json_store] {n} users: write {write_s * 1000:.1f} ms, cold read {cold_read_s * 1000:.1f} ms", file=sys.stderr)
+		del doc, store, user_store
+	return out
+
+
+def bench_scoring(iterations: int) -> Dict[str, Any]:
+	cm = ConversationManager()
+	state = cm.create_session_state()
+	state.math_subtract = (100, 7, 93)
+	state.math_add = (15, 9, 24)
+	by_qtype: Dict[str, List[float]] = defaultdict(list)
+	for q in cm.questions:
+		for answer in ANSWERS:
+			started = time.perf_counter()
+			for _ in range(iterations):
+				cm._score_dynamic_answer(q, state, answer)
+			by_qtype[q.qtype or 'keywords'].append((time.perf_counter() - started) / iterations)
+	return {
+		"iterations": iterations,
+		"answers": len(ANSWERS),
+		"ns_per_call": {qtype: round(statistics.mean(v) * 1e9, 1) for qtype, v in sorted(by_qtype.items())},
+		"overall_ns_per_call": round(statistics.mean(x for v in by_qtype.values() for x in v) * 1e9, 1),
+	}
+
+
+def _git_commit() -> str | None:
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+	except Exception:
+		return None
+
+
+def _ints(value: str) -> List[int]:
+	return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Load, latency and micro-benchmarks with local stand-ins for XTTS and ASR.')
+	parser.add_argument('--out', default='benchmark_results.json', help="JSON results path, or '-' for stdout")
+	parser.add_argument('--server', choices=['threaded', 'async'], default='threaded', help='app.py under werkzeug, or app_async.py under uvicorn')
+	parser.add_argument('--concurrency', type=_ints, default=[1, 4, 16], help='comma-separated concurrent assessments per level')
+	parser.add_argument('--sessions-per-worker', type=int, default=2, help='assessments per concurrent client at each level')
+	parser.add_argument('--xtts-latency-ms', type=float, default=150.0)
+	parser.add_argument('--xtts-ms-per-char', type=float, default=1.0)
+	parser.add_argument('--clone-latency-ms', type=float, default=50.0)
+	parser.add_argument('--asr-latency-ms', type=float, default=300.0)
+	parser.add_argument('--store-sizes', type=_ints, default=[10_000, 100_000, 1_000_000], help='JSONStore user counts')
+	parser.add_argument('--score-iterations', type=int, default=2000, help='calls per question and answer')
+	parser.add_argument('--skip-load', action='store_true')
+	parser.add_argument('--skip-micro', action='store_true')
+	args = parser.parse_args()
+
+	results: Dict[str, Any] = {
+		"meta": {
+			"started_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+			"git_commit": _git_commit(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"cpu_count": os.cpu_count(),
+			"config": {k: v for k, v in vars(args).items() if k != 'out'},
+		},
+	}
+	with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+		cwd = os.getcwd()
+		# The app keeps uploads/, data/ and cache/ relative to the working directory
+		os.chdir(workdir)
+		try:
+			if not args.skip_load:
+				results["load"] = run_load(args, workdir)
+			if not args.skip_micro:
+				results["micro"] = {
+					"json_store": bench_json_store(args.store_sizes, workdir),
+					"score_dynamic_answer": bench_scoring(args.score_iterations),
+				}
+		finally:
+			os.chdir(cwd)
+	body = json.dumps(results, indent=2)
+	if args.out == '-':
+		print(body)
+	else:
+		with open(args.out, 'w', encoding='utf-8') as f:
+			f.write(body + '\n')
+		print(f"Results written to {args.out}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
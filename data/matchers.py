@@ -0,0 +1,167 @@
+import re
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+# One pass over the answer: signed integers and runs of letters; everything else separates tokens
+_TOKEN_RE = re.compile(r"(-?\d+)|([^\W\d_]+)")
+
+
+class Answer:
+	"""A user answer tokenized once per turn and shared by every matcher."""
+
+	__slots__ = ('tokens', 'token_set', 'numbers')
+
+	def __init__(self, text: str) -> None:
+		tokens: List[str] = []
+		numbers: List[int] = []
+		for number, word in _TOKEN_RE.findall(text or ''):
+			if number:
+				numbers.append(int(number))
+				tokens.append(number.lstrip('-'))
+			else:
+				tokens.append(word.upper())
+		self.tokens: Tuple[str, ...] = tuple(tokens)
+		self.token_set: FrozenSet[str] = frozenset(tokens)
+		self.numbers: Tuple[int, ...] = tuple(numbers)
+
+
+def _keyword_tokens(keyword: Any) -> Tuple[str, ...]:
+	"""Split a keyword the way answers are split, so "3PM" and "3 pm" both become ("3", "PM")."""
+	return tuple(number.lstrip('-') or word for number, word in _TOKEN_RE.findall(str(keyword).upper()))
+
+
+_VOWELS = frozenset('AEIOU')
+
+
+def _inflect(word: str, suffixes: Iterable[str]) -> List[str]:
+	"""The word plus each allowed suffix; vowel suffixes also drop a final E or double a final consonant."""
+	forms = [word]
+	if not word.isalpha():
+		return forms
+	for suffix in suffixes:
+		forms.append(word + suffix)
+		if suffix[:1] in _VOWELS:
+			if word.endswith('E'):
+				forms.append(word[:-1] + suffix)  # SERVE -> SERVING
+			elif len(word) >= 3 and word[-1] not in _VOWELS and word[-1] not in 'WXY' and word[-2] in _VOWELS and word[-3] not in _VOWELS:
+				forms.append(word + word[-1] + suffix)  # CUT -> CUTTING
+	return list(dict.fromkeys(forms))
+
+
+class KeywordMatcher:
+	"""Full points if any keyword is said as whole words ("MAY" does not match "maybe").
+
+	A question may list `inflections` in its params, suffixes such as ["S", "ING"] that the last word
+	of a keyword may carry ("ELECTION" then matches "elections"). Every accepted form is indexed by
+	its first token, so scoring is one pass over the answer's tokens with a dict lookup per token.
+	"""
+
+	__slots__ = ('max_points', 'starts')
+
+	def __init__(self, keywords: Iterable[Any], max_points: int, inflections: Iterable[str] = ()) -> None:
+		self.max_points = max_points
+		suffixes = [str(s).upper() for s in inflections]
+		# first token -> [(keyword index, remaining tokens)] for every accepted form of every keyword
+		self.starts: Dict[str, List[Tuple[int, Tuple[str, ...]]]] = {}
+		unique = dict.fromkeys(t for t in map(_keyword_tokens, keywords) if t)
+		for index, tokens in enumerate(unique):
+			for last in _inflect(tokens[-1], suffixes):
+				form = tokens[:-1] + (last,)
+				self.starts.setdefault(form[0], []).append((index, form[1:]))
+
+	def _matches(self, answer: Answer) -> Iterator[int]:
+		"""Index of each keyword said in the answer (repeats possible), in order of appearance."""
+		tokens = answer.tokens
+		for i, token in enumerate(tokens):
+			for index, rest in self.starts.get(token, ()):
+				if not rest or tokens[i + 1:i + 1 + len(rest)] == rest:
+					yield index
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		if next(self._matches(answer), None) is not None:
+			return self.max_points
+		return 0
+
+
+class KeywordCountMatcher(KeywordMatcher):
+	"""One point per distinct keyword mentioned, up to max_points."""
+
+	__slots__ = ()
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		return min(len(set(self._matches(answer))), self.max_points)
+
+
+class DigitsMatcher:
+	"""One point per expected digit that was spoken, in any order, up to max_points."""
+
+	__slots__ = ('max_points', 'expected')
+
+	def __init__(self, sequence: Iterable[Any], max_points: int) -> None:
+		self.max_points = max_points
+		self.expected = tuple(str(d) for d in sequence)
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		return min(sum(1 for d in self.expected if d in answer.token_set), self.max_points)
+
+
+class ArithmeticMatcher:
+	"""Full points if the first number spoken equals the answer stored in state.<slot> (a, b, answer)."""
+
+	__slots__ = ('max_points', 'slot')
+
+	def __init__(self, slot: str, max_points: int) -> None:
+		self.max_points = max_points
+		self.slot = slot
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		cfg = getattr(state, self.slot, None)
+		expected = int(cfg[2]) if cfg else 0
+		if answer.numbers and answer.numbers[0] == expected:
+			return self.max_points
+		return 0
+
+
+_YES = frozenset(["YES", "YEAH", "YEP", "YA", "SURE"])
+_NO = frozenset(["NO", "NOPE"])
+
+
+class YesNoMatcher:
+	__slots__ = ('max_points', 'expected_yes')
+
+	def __init__(self, expected: Any, max_points: int) -> None:
+		self.max_points = max_points
+		self.expected_yes = str(expected).lower() in ['yes', 'true', '1']
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		is_yes = not _YES.isdisjoint(answer.token_set) and _NO.isdisjoint(answer.token_set)
+		return self.max_points if is_yes == self.expected_yes else 0
+
+
+class MinWordsMatcher:
+	__slots__ = ('max_points', 'min_words')
+
+	def __init__(self, min_words: int, max_points: int) -> None:
+		self.max_points = max_points
+		self.min_words = min_words
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		return self.max_points if len(answer.tokens) >= self.min_words else 0
+
+
+# qtype -> factory(question params, keywords, max_points); unknown qtypes use keyword matching
+_FACTORIES: Dict[Optional[str], Callable[[Dict[str, Any], List[str], int], Any]] = {
+	'math_subtract': lambda p, kw, m: ArithmeticMatcher('math_subtract', m),
+	'math_add': lambda p, kw, m: ArithmeticMatcher('math_add', m),
+	'repeat_digits': lambda p, kw, m: DigitsMatcher(p.get('sequence', []), m),
+	'yes_no': lambda p, kw, m: YesNoMatcher(p.get('expected', 'yes'), m),
+	'free_speech_min_words': lambda p, kw, m: MinWordsMatcher(int(p.get('min_words', 5)), m),
+	'planning_keywords': lambda p, kw, m: KeywordCountMatcher(p.get('keywords', []), m, p.get('inflections', ())),
+}
+
+
+def compile_matcher(qtype: Optional[str], params: Optional[Dict[str, Any]], keywords: List[str], max_points: int) -> Any:
+	params = params or {}
+	factory = _FACTORIES.get(qtype)
+	if factory is None:
+		return KeywordMatcher(keywords, max_points, params.get('inflections', ()))
+	return factory(params, keywords, max_points)
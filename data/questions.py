@@ -1,8 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 import json
 import os
 
+from data.matchers import Answer, compile_matcher
+
 
 @dataclass
 class Question:
@@ -14,15 +16,20 @@ class Question:
 	qtype: Optional[str] = None
 	params: Optional[Dict[str, Any]] = None
 
+	# Compiled once from qtype/params/keywords (see data/matchers.py)
+	matcher: Any = field(default=None, init=False, repr=False, compare=False)
+
+	def __post_init__(self) -> None:
+		self.matcher = compile_matcher(self.qtype, self.params, self.keywords, self.max_points)
+
+	def score(self, answer: Answer, state: Any = None) -> int:
+		"""Score a tokenized answer; dynamic types read their expected values from the session state."""
+		return self.matcher.score(answer, state)
+
 	def score_response(self, user_text: str) -> int:
 		if not user_text:
 			return 0
-		# Default keyword-based scoring; dynamic types are handled by the conversation manager
-		text_upper = user_text.upper()
-		if not self.keywords:
-			return 0
-		correct = any(kw.upper() in text_upper for kw in self.keywords)
-		return self.max_points if correct else 0
+		return self.matcher.score(Answer(user_text))
 
 
 def load_questions() -> List[Question]:
@@ -0,0 +1,74 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+AUDIO_EXTS = {'.wav', '.flac', '.mp3', '.m4a', '.ogg', '.webm'}
+
+_server = None
+
+
+def _digest(path: Path) -> str:
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			h.update(block)
+	return h.hexdigest()
+
+
+def _init_worker() -> None:
+	global _server
+	# One process per core; keep torch from oversubscribing each of them
+	try:
+		import torch
+		torch.set_num_threads(1)
+	except Exception:
+		pass
+	import xtts_server
+	_server = xtts_server
+
+
+def _ingest(item):
+	path, digest = item
+	with open(path, 'rb') as f:
+		data = f.read()
+	voice_id, ref_path, deduplicated = _server.ingest_voice(data, Path(path).suffix.lower() or '.wav', digest)
+	return path, digest, voice_id, ref_path, deduplicated
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Bulk-import caregiver recordings into the XTTS voice directory.')
+	parser.add_argument('source', help='directory of recordings (searched recursively)')
+	parser.add_argument('--voice-dir', default='voices', help='XTTS voice directory (XTTS_VOICE_DIR of the server)')
+	parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='normalization processes')
+	parser.add_argument('--manifest', default='voice_import.jsonl', help='output: one {"file", "voice_id", "deduplicated"} line per recording')
+	args = parser.parse_args()
+	# Inherited by the worker processes before they import xtts_server
+	os.environ['XTTS_VOICE_DIR'] = os.path.abspath(args.voice_dir)
+
+	started = time.perf_counter()
+	files = sorted(p for p in Path(args.source).rglob('*') if p.is_file() and p.suffix.lower() in AUDIO_EXTS)
+	# Hash in the parent so identical recordings within this batch are normalized only once
+	by_digest = {}
+	for path in files:
+		by_digest.setdefault(_digest(path), []).append(str(path))
+	unique = [(paths[0], digest) for digest, paths in by_digest.items()]
+
+	created = 0
+	with Pool(processes=max(1, args.workers), initializer=_init_worker) as pool, open(args.manifest, 'w', encoding='utf-8') as out:
+		for path, digest, voice_id, ref_path, deduplicated in pool.imap_unordered(_ingest, unique):
+			created += 0 if deduplicated else 1
+			for i, source in enumerate(by_digest[digest]):
+				out.write(json.dumps({"file": source, "voice_id": voice_id, "voice_path": ref_path, "deduplicated": deduplicated or i > 0}) + "\n")
+	elapsed = time.perf_counter() - started
+	print(f"Imported {len(files)} recordings: {created} new voices, {len(files) - created} duplicates in {elapsed:.1f}s ({args.manifest})")
+
+
+if __name__ == '__main__':
+	main()
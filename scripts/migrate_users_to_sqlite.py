@@ -0,0 +1,21 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.storage import SQLiteUserStore  # noqa: E402
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Import users from the JSON user store into SQLite.')
+	parser.add_argument('--json', default='data/users.json', help='source JSONStore document')
+	parser.add_argument('--db', default='data/users.db', help='target SQLite database')
+	args = parser.parse_args()
+	store = SQLiteUserStore(args.db)
+	added = store.import_json(args.json)
+	print(f"Imported {added} users into {args.db} ({store.count()} total)")
+
+
+if __name__ == '__main__':
+	main()
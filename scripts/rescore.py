@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data.matchers import Answer  # noqa: E402
+from services.conversation import ConversationManager  # noqa: E402
+from services.scoring import _category  # noqa: E402
+
+_WORD_RECALL = ('three_word_registration', 'delayed_recall')
+
+_manager = None
+_questions = None
+
+
+def _init_worker() -> None:
+	global _manager, _questions
+	_manager = ConversationManager()
+	_questions = {q.id: q for q in _manager.questions}
+
+
+def _score_chunk(lines):
+	"""Score a chunk of raw JSONL lines against the current question bank.
+
+	Records are grouped by question so each compiled matcher is looked up once per chunk. Returns
+	flat arrays (session ids, domain slots, new points, max points, old points or -1) plus a count
+	of records whose question is no longer in the bank.
+	"""
+	groups = {}
+	for line in lines:
+		if not line.strip():
+			continue
+		rec = json.loads(line)
+		groups.setdefault(rec.get('question_id'), []).append(rec)
+	sessions, slots, points, maxes, old = [], [], [], [], []
+	skipped = 0
+	for qid, recs in groups.items():
+		if qid in _WORD_RECALL:
+			slot, max_points = _manager.domains.slot(qid), 3
+			score = lambda r: _manager.score_word_recall(tuple(r.get('context') or ()), r.get('user_text') or '')
+		elif qid in _questions:
+			q = _questions[qid]
+			slot, max_points = _manager.domains.slot(q.domain), q.max_points
+			# Dynamic math questions are scored against the (a, b, answer) recorded with the turn
+			score = lambda r, q=q: q.score(Answer(r.get('user_text') or ''), SimpleNamespace(math_subtract=r.get('context'), math_add=r.get('context')))
+		else:
+			skipped += len(recs)
+			continue
+		for r in recs:
+			sessions.append(r['session_id'])
+			slots.append(slot)
+			points.append(score(r))
+			maxes.append(max_points)
+			old.append(r['points'] if r.get('points') is not None else -1)
+	return (
+		sessions,
+		np.asarray(slots, dtype=np.int32),
+		np.asarray(points, dtype=np.int32),
+		np.asarray(maxes, dtype=np.int32),
+		np.asarray(old, dtype=np.int32),
+		skipped,
+	)
+
+
+def _chunks(stream, size):
+	chunk = []
+	for line in stream:
+		chunk.append(line)
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def _snapshot(names, points_row, max_row, touched_row):
+	"""Same shape as ScoringEngine.snapshot()."""
+	out = {}
+	for i in np.flatnonzero(touched_row):
+		p, m = int(points_row[i]), int(max_row[i])
+		out[names[i]] = {"points": p, "max_points": m, "percent": round(p / m * 100.0, 2) if m else 0.0, "category": _category(p, m)}
+	p, m = int(points_row.sum()), int(max_row.sum())
+	out['overall'] = {"points": p, "max_points": m, "percent": round(p / m * 100.0, 2) if m else 0.0, "category": _category(p, m)}
+	return out
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Re-score logged turns (TURN_LOG_PATH JSONL) against the current question bank.')
+	parser.add_argument('turns', help="turn log JSONL, or '-' for stdin")
+	parser.add_argument('--out', default='rescored.jsonl', help='per-session snapshots (JSONL)')
+	parser.add_argument('--diff', default='rescore_diff.jsonl', help='sessions whose domain points changed (JSONL)')
+	parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+	parser.add_argument('--chunk-size', type=int, default=20000, help='turns per worker task')
+	args = parser.parse_args()
+
+	started = time.perf_counter()
+	_init_worker()
+	names = _manager.domains.names
+	stream = sys.stdin if args.turns == '-' else open(args.turns, 'r', encoding='utf-8')
+	parts = []
+	skipped = 0
+	with stream, Pool(processes=max(1, args.workers), initializer=_init_worker) as pool:
+		for part in pool.imap(_score_chunk, _chunks(stream, args.chunk_size)):
+			skipped += part[5]
+			if part[0]:
+				parts.append(part)
+	if not parts:
+		print(f"No scorable turns ({skipped} skipped)")
+		return
+
+	# Aggregate every turn at once: session rows via np.unique, then one bincount per measure
+	session_ids, rows = np.unique(np.concatenate([np.asarray(p[0], dtype=object).astype(str) for p in parts]), return_inverse=True)
+	slots = np.concatenate([p[1] for p in parts])
+	n_sessions, n_domains = len(session_ids), len(_manager.domains)
+	flat = rows.astype(np.int64) * n_domains + slots
+	size = n_sessions * n_domains
+
+	def total(values):
+		return np.bincount(flat, weights=values, minlength=size).astype(np.int64).reshape(n_sessions, n_domains)
+
+	new_points = total(np.concatenate([p[2] for p in parts]))
+	max_points = total(np.concatenate([p[3] for p in parts]))
+	old_raw = np.concatenate([p[4] for p in parts])
+	has_old = total((old_raw >= 0).astype(np.int64)) > 0
+	old_points = total(np.maximum(old_raw, 0))
+	touched = total(np.ones_like(slots)) > 0
+
+	changed = np.flatnonzero(((new_points != old_points) & has_old).any(axis=1))
+	with open(args.out, 'w', encoding='utf-8') as out:
+		for r in range(n_sessions):
+			out.write(json.dumps({"session_id": session_ids[r], "scores": _snapshot(names, new_points[r], max_points[r], touched[r])}) + '\n')
+	with open(args.diff, 'w', encoding='utf-8') as diff:
+		for r in changed:
+			cols = np.flatnonzero((new_points[r] != old_points[r]) & has_old[r])
+			diff.write(json.dumps({
+				"session_id": session_ids[r],
+				"changes": {names[c]: {"old": int(old_points[r, c]), "new": int(new_points[r, c]), "max_points": int(max_points[r, c])} for c in cols},
+				"overall": {"old": int(old_points[r][has_old[r]].sum()), "new": int(new_points[r][has_old[r]].sum())},
+			}) + '\n')
+	turns = len(slots)
+	elapsed = time.perf_counter() - started
+	print(f"Re-scored {turns} turns in {n_sessions} sessions ({skipped} skipped) in {elapsed:.1f}s ({turns / elapsed:,.0f} turns/s); {len(changed)} sessions changed -> {args.out}, {args.diff}")
+
+
+if __name__ == '__main__':
+	main()
@@ -1,5 +1,8 @@
+import asyncio
 import os
-from typing import Literal
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Any, Dict, Literal, Optional, Union
 
 try:
 	import google.generativeai as genai  # type: ignore
@@ -7,29 +10,60 @@ try:
 except Exception:
 	_GOOGLE_AVAILABLE = False
 
+from services.local_asr import create_local_asr, local_asr_available
+
+AudioInput = Union[str, bytes, bytearray, memoryview, IO[bytes]]
+
 
 class ASRService:
 	"""ASR abstraction. Uses Gemini Audio Transcription if GOOGLE_API_KEY is set; otherwise returns a stub.
 
 	Expected models: "gemini-1.5-flash" with audio transcription via content parts.
+	With ASR_BACKEND=local, transcription runs offline on CPU with faster-whisper instead
+	(see services/local_asr.py); the model is loaded once when the service is created.
+
+	Audio can be given as a path, raw bytes or a binary stream (e.g. an uploaded file), so uploads
+	never need to touch disk. One model client is kept per model name, and transcriptions submitted
+	through submit() run on a bounded pool (ASR_WORKERS, default 4). atranscribe() is the
+	non-blocking variant used by the async app.
 	"""
 
 	def __init__(self) -> None:
-		self.mode: Literal['gemini', 'stub'] = 'stub'
+		self.mode: Literal['gemini', 'local', 'stub'] = 'stub'
+		self._local = None
+		backend = os.getenv('ASR_BACKEND', '').lower()
 		api_key = os.getenv('GOOGLE_API_KEY')
-		if api_key and _GOOGLE_AVAILABLE:
+		if backend == 'local' and local_asr_available():
+			self._local = create_local_asr()
+			if self._local is not None:
+				self.mode = 'local'
+		elif backend != 'stub' and api_key and _GOOGLE_AVAILABLE:
 			genai.configure(api_key=api_key)
 			self.mode = 'gemini'
+		self._models: Dict[str, Any] = {}
+		self._models_lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max(1, int(os.getenv('ASR_WORKERS', '4'))), thread_name_prefix='asr')
+
+	def _model(self, model_name: str) -> Any:
+		model = self._models.get(model_name)
+		if model is None:
+			with self._models_lock:
+				model = self._models.get(model_name)
+				if model is None:
+					model = genai.GenerativeModel(model_name)
+					self._models[model_name] = model
+		return model
+
+	def submit(self, audio: AudioInput, mime_type: Optional[str] = None) -> 'Future[str]':
+		"""Queue a transcription on the ASR pool; bytes/streams should be read before submitting."""
+		return self._executor.submit(self.transcribe, audio, mime_type)
 
-	def transcribe(self, audio_path: str) -> str:
+	def transcribe(self, audio: AudioInput, mime_type: Optional[str] = None) -> str:
 		if self.mode == 'gemini':
 			model_name = os.getenv('GEMINI_ASR_MODEL', 'gemini-1.5-flash')
-			model = genai.GenerativeModel(model_name)
-			# Build content with audio file reference
-			mime = _guess_mime(audio_path)
+			model = self._model(model_name)
 			try:
-				with open(audio_path, 'rb') as f:
-					audio_bytes = f.read()
+				audio_bytes, mime = _read_audio(audio, mime_type)
 				parts = [
 					{"text": "Transcribe the following audio to plain text."},
 					{"inline_data": {"mime_type": mime, "data": audio_bytes}},
@@ -39,14 +73,50 @@ class ASRService:
 				return text.strip()
 			except Exception:
 				return ""
+		if self.mode == 'local':
+			audio_bytes, _ = _read_audio(audio, mime_type)
+			return self._local.transcribe(audio_bytes)
 		# Fallback stub if Gemini is not configured
 		return ""
 
+	async def atranscribe(self, audio: AudioInput, mime_type: Optional[str] = None) -> str:
+		"""transcribe() for the async app: Gemini is awaited directly, local models run on the ASR pool."""
+		if self.mode == 'gemini':
+			model = self._model(os.getenv('GEMINI_ASR_MODEL', 'gemini-1.5-flash'))
+			try:
+				audio_bytes, mime = _read_audio(audio, mime_type)
+				parts = [
+					{"text": "Transcribe the following audio to plain text."},
+					{"inline_data": {"mime_type": mime, "data": audio_bytes}},
+				]
+				resp = await model.generate_content_async(parts)
+				return (getattr(resp, 'text', '') or '').strip()
+			except Exception:
+				return ""
+		if self.mode == 'local':
+			return await asyncio.wrap_future(self.submit(audio, mime_type))
+		return ""
+
+	def stats(self) -> Dict[str, Any]:
+		if self._local is not None:
+			return self._local.stats()
+		return {}
+
+
+def _read_audio(audio: AudioInput, mime_type: Optional[str]) -> tuple:
+	if isinstance(audio, str):
+		with open(audio, 'rb') as f:
+			return f.read(), mime_type or guess_mime(audio)
+	if isinstance(audio, (bytes, bytearray, memoryview)):
+		return bytes(audio), mime_type or 'application/octet-stream'
+	name = getattr(audio, 'name', '') or ''
+	return audio.read(), mime_type or guess_mime(name if isinstance(name, str) else '')
+
 
-def _guess_mime(path: str) -> str:
+def guess_mime(path: str) -> str:
 	p = path.lower()
 	if p.endswith('.wav'): return 'audio/wav'
 	if p.endswith('.mp3'): return 'audio/mpeg'
 	if p.endswith('.m4a'): return 'audio/mp4'
 	if p.endswith('.webm'): return 'audio/webm'
-	return 'application/octet-stream' 
\ No newline at end of file
+	return 'application/octet-stream'
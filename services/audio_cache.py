@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+_PUNCT_MAP = str.maketrans({
+	'‘': "'", '’': "'", '“': '"', '”': '"',
+	'–': '-', '—': '-', '…': '...',
+})
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+	"""Canonical form used for cache keys: NFKC, ASCII punctuation variants, lowercase, collapsed whitespace."""
+	t = unicodedata.normalize('NFKC', text or '').translate(_PUNCT_MAP)
+	return _WS_RE.sub(' ', t).strip().lower()
+
+
+def utterance_key(voice_id: str, text: str, language: str = 'en') -> str:
+	raw = '\x1f'.join([voice_id or '', (language or 'en').lower(), normalize_text(text)])
+	return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class UtteranceCache:
+	"""Two-tier, content-addressed cache of synthesized audio.
+
+	Tier 1 is an in-memory LRU bounded by total bytes; tier 2 is a directory of
+	files named by key, bounded by total size and evicted least-recently-used.
+
+	Environment variables:
+	- TTS_CACHE_DIR: on-disk store (default: cache/tts)
+	- TTS_CACHE_MEMORY_BYTES: memory tier cap (default: 64 MiB)
+	- TTS_CACHE_DISK_BYTES: disk tier cap (default: 1 GiB)
+	"""
+
+	def __init__(self, directory: Optional[str] = None, memory_bytes: Optional[int] = None, disk_bytes: Optional[int] = None) -> None:
+		self.directory = directory or os.getenv('TTS_CACHE_DIR', os.path.join('cache', 'tts'))
+		self.memory_limit = memory_bytes if memory_bytes is not None else int(os.getenv('TTS_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+		self.disk_limit = disk_bytes if disk_bytes is not None else int(os.getenv('TTS_CACHE_DISK_BYTES', str(1024 * 1024 * 1024)))
+		self._lock = threading.Lock()
+		self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+		self._memory_size = 0
+		self._disk: "OrderedDict[str, int]" = OrderedDict()
+		self._disk_size = 0
+		self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+		os.makedirs(self.directory, exist_ok=True)
+		self._load_disk_index()
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, f"{key}.bin")
+
+	def _load_disk_index(self) -> None:
+		entries = []
+		for name in os.listdir(self.directory):
+			if not name.endswith('.bin'):
+				continue
+			try:
+				st = os.stat(os.path.join(self.directory, name))
+			except OSError:
+				continue
+			entries.append((st.st_mtime, name[:-4], st.st_size))
+		for _, key, size in sorted(entries):
+			self._disk[key] = size
+			self._disk_size += size
+
+	def get(self, key: str) -> Optional[bytes]:
+		with self._lock:
+			data = self._memory.get(key)
+			if data is not None:
+				self._memory.move_to_end(key)
+				self.stats['memory_hits'] += 1
+				return data
+			on_disk = key in self._disk
+		if on_disk:
+			try:
+				with open(self._path(key), 'rb') as f:
+					data = f.read()
+				os.utime(self._path(key))
+			except OSError:
+				data = None
+			with self._lock:
+				if data is not None:
+					if key in self._disk:
+						self._disk.move_to_end(key)
+					self.stats['disk_hits'] += 1
+					self._remember(key, data)
+					return data
+				size = self._disk.pop(key, None)
+				if size is not None:
+					self._disk_size -= size
+		with self._lock:
+			self.stats['misses'] += 1
+		return None
+
+	def contains(self, key: str) -> bool:
+		"""Presence check that does not touch hit/miss counters or recency."""
+		with self._lock:
+			return key in self._memory or key in self._disk
+
+	def put(self, key: str, data: bytes) -> None:
+		if not data:
+			return
+		path = self._path(key)
+		tmp = f"{path}.{threading.get_ident()}.tmp"
+		try:
+			with open(tmp, 'wb') as f:
+				f.write(data)
+			os.replace(tmp, path)
+		except OSError:
+			try:
+				os.remove(tmp)
+			except OSError:
+				pass
+			path = None
+		with self._lock:
+			self._remember(key, data)
+			if path is None:
+				return
+			self._disk_size -= self._disk.pop(key, 0)
+			self._disk[key] = len(data)
+			self._disk_size += len(data)
+			evicted = []
+			while self._disk_size > self.disk_limit and len(self._disk) > 1:
+				old_key, old_size = self._disk.popitem(last=False)
+				self._disk_size -= old_size
+				self.stats['evictions'] += 1
+				evicted.append(old_key)
+		for old_key in evicted:
+			try:
+				os.remove(self._path(old_key))
+			except OSError:
+				pass
+
+	def _remember(self, key: str, data: bytes) -> None:
+		# Caller holds the lock
+		if len(data) > self.memory_limit:
+			return
+		old = self._memory.pop(key, None)
+		if old is not None:
+			self._memory_size -= len(old)
+		self._memory[key] = data
+		self._memory_size += len(data)
+		while self._memory_size > self.memory_limit:
+			_, dropped = self._memory.popitem(last=False)
+			self._memory_size -= len(dropped)
+
+	def info(self) -> Dict[str, int]:
+		with self._lock:
+			return {
+				**self.stats,
+				"memory_entries": len(self._memory),
+				"memory_bytes": self._memory_size,
+				"disk_entries": len(self._disk),
+				"disk_bytes": self._disk_size,
+			}
+
+
+def finalize_streaming_wav(data: bytes) -> bytes:
+	"""Patch the RIFF and data sizes of a streamed WAV (written with unknown length) once complete."""
+	if len(data) < 44 or data[:4] != b'RIFF' or data[36:40] != b'data':
+		return data
+	buf = bytearray(data)
+	buf[4:8] = (len(buf) - 8).to_bytes(4, 'little')
+	buf[40:44] = (len(buf) - 44).to_bytes(4, 'little')
+	return bytes(buf)
@@ -0,0 +1,138 @@
+import io
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+	import soundfile as sf  # type: ignore
+	_SOUNDFILE = True
+except Exception:
+	_SOUNDFILE = False
+
+# XTTS v2 output rate; raw PCM from xtts_server carries it in the content type as well
+DEFAULT_SR = 24000
+
+MIME_TYPES: Dict[str, str] = {
+	'wav': 'audio/wav',
+	'pcm': f'audio/L16;rate={DEFAULT_SR};channels=1',
+	'ogg': 'audio/ogg',
+	'mp3': 'audio/mpeg',
+}
+
+# Accept media types -> output format
+_ACCEPT: Dict[str, str] = {
+	'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav',
+	'audio/l16': 'pcm', 'audio/pcm': 'pcm',
+	'audio/ogg': 'ogg', 'audio/opus': 'ogg',
+	'audio/mpeg': 'mp3', 'audio/mp3': 'mp3',
+}
+
+
+def _available() -> Dict[str, bool]:
+	out = {'wav': True, 'pcm': True, 'ogg': False, 'mp3': False}
+	if _SOUNDFILE:
+		formats = sf.available_formats()
+		out['ogg'] = 'OGG' in formats and 'OPUS' in sf.available_subtypes('OGG')
+		out['mp3'] = 'MP3' in formats
+	return out
+
+
+AVAILABLE = _available()
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str] = None) -> str:
+	"""Pick an output format from an explicit parameter, else the Accept header; WAV by default.
+
+	Unknown or unavailable formats fall back to WAV rather than failing the request.
+	"""
+	if requested:
+		fmt = requested.strip().lower()
+		fmt = {'opus': 'ogg', 'l16': 'pcm', 'pcm16': 'pcm', 'mpeg': 'mp3', 'wave': 'wav'}.get(fmt, fmt)
+		return fmt if AVAILABLE.get(fmt) else 'wav'
+	best, best_q = 'wav', 0.0
+	for part in (accept or '').split(','):
+		media, _, params = part.strip().partition(';')
+		fmt = _ACCEPT.get(media.strip().lower())
+		if fmt is None or not AVAILABLE[fmt]:
+			continue
+		q = 1.0
+		for param in params.split(';'):
+			key, _, value = param.strip().partition('=')
+			if key == 'q':
+				try:
+					q = float(value)
+				except ValueError:
+					q = 0.0
+		if q > best_q:
+			best, best_q = fmt, q
+	return best
+
+
+def wav_header(data_len: int, sample_rate: int = DEFAULT_SR, channels: int = 1, bits: int = 16) -> bytes:
+	return _riff_header(36 + data_len, data_len, sample_rate, channels, bits)
+
+
+def streaming_wav_header(sample_rate: int = DEFAULT_SR, channels: int = 1, bits: int = 16) -> bytes:
+	"""WAV header with unknown (max) length so players can start before the data ends."""
+	return _riff_header(0xFFFFFFFF, 0xFFFFFFFF, sample_rate, channels, bits)
+
+
+def _riff_header(riff_size: int, data_size: int, sample_rate: int, channels: int, bits: int) -> bytes:
+	byte_rate = sample_rate * channels * bits // 8
+	block_align = channels * bits // 8
+	return (
+		b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+		+ b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, block_align, bits)
+		+ b'data' + struct.pack('<I', data_size)
+	)
+
+
+def wav_from_pcm(pcm: bytes, sample_rate: int = DEFAULT_SR) -> bytes:
+	"""Wrap mono PCM16 in a WAV header (no re-encode)."""
+	return wav_header(len(pcm), sample_rate) + pcm
+
+
+def pcm_from_wav(wav: bytes) -> Tuple[memoryview, int]:
+	"""(PCM16 payload view, sample rate) of a mono PCM16 WAV, without copying the samples."""
+	view = memoryview(wav)
+	if len(wav) < 12 or wav[:4] != b'RIFF' or wav[8:12] != b'WAVE':
+		raise ValueError('not a WAV file')
+	off, sample_rate = 12, DEFAULT_SR
+	while off + 8 <= len(wav):
+		chunk, size = wav[off:off + 4], struct.unpack_from('<I', wav, off + 4)[0]
+		if chunk == b'fmt ':
+			fmt_tag, channels, sample_rate = struct.unpack_from('<HHI', wav, off + 8)
+			bits = struct.unpack_from('<H', wav, off + 22)[0]
+			if fmt_tag != 1 or channels != 1 or bits != 16:
+				raise ValueError('expected mono PCM16 WAV')
+		elif chunk == b'data':
+			# Streamed WAVs carry 0xFFFFFFFF as the data size; clamp to what is there
+			end = min(len(wav), off + 8 + size)
+			return view[off + 8:end - ((end - off - 8) % 2)], sample_rate
+		off += 8 + size + (size % 2)
+	raise ValueError('WAV has no data chunk')
+
+
+def encode(wav: bytes, fmt: str) -> bytes:
+	"""Re-encode a mono PCM16 WAV to fmt ('wav', 'pcm', 'ogg' Opus or 'mp3')."""
+	if fmt == 'wav':
+		return wav
+	pcm, sample_rate = pcm_from_wav(wav)
+	if fmt == 'pcm':
+		return bytes(pcm)
+	if not AVAILABLE.get(fmt):
+		raise ValueError(f'unsupported audio format: {fmt}')
+	samples = np.frombuffer(pcm, dtype='<i2')
+	buf = io.BytesIO()
+	if fmt == 'ogg':
+		sf.write(buf, samples, sample_rate, format='OGG', subtype='OPUS')
+	else:
+		sf.write(buf, samples, sample_rate, format='MP3', subtype='MPEG_LAYER_III')
+	return buf.getvalue()
+
+
+def mime_type(fmt: str, sample_rate: int = DEFAULT_SR) -> str:
+	if fmt == 'pcm':
+		return f'audio/L16;rate={sample_rate};channels=1'
+	return MIME_TYPES[fmt]
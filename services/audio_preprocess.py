@@ -0,0 +1,175 @@
+import io
+import os
+import shutil
+import subprocess
+import wave
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+	import soundfile as sf  # type: ignore
+	_SOUNDFILE = True
+except Exception:
+	_SOUNDFILE = False
+
+try:
+	import av  # type: ignore
+	_PYAV = True
+except Exception:
+	_PYAV = False
+
+try:
+	from scipy.signal import resample_poly  # type: ignore
+	_SCIPY = True
+except Exception:
+	_SCIPY = False
+
+TARGET_SR = 16000
+_FRAME_SECONDS = 0.02
+
+
+@dataclass
+class PreparedAudio:
+	data: bytes
+	mime_type: str
+	input_seconds: float
+	output_seconds: float
+
+	@property
+	def trimmed_seconds(self) -> float:
+		return max(0.0, self.input_seconds - self.output_seconds)
+
+	@property
+	def is_silent(self) -> bool:
+		return self.output_seconds == 0.0
+
+
+def preprocess_audio(data: bytes) -> Optional[PreparedAudio]:
+	"""Decode, downmix to mono, resample to 16 kHz, trim leading/trailing silence and re-encode.
+
+	Returns None when the upload cannot be decoded here; callers should then pass it through untouched.
+
+	Environment variables:
+	- ASR_VAD_THRESHOLD_DB: frames quieter than the loudest frame by more than this are silence (default: 35)
+	- ASR_VAD_FLOOR_DBFS: frames below this absolute level are always silence (default: -50)
+	- ASR_VAD_PAD_MS: audio kept around the detected speech (default: 200)
+	"""
+	decoded = _decode(data)
+	if decoded is None:
+		return None
+	samples, sr = decoded
+	input_seconds = samples.shape[0] / sr if sr else 0.0
+	mono = _to_mono(samples)
+	mono = _resample(mono, sr, TARGET_SR)
+	trimmed = trim_silence(
+		mono,
+		TARGET_SR,
+		threshold_db=float(os.getenv('ASR_VAD_THRESHOLD_DB', '35')),
+		floor_dbfs=float(os.getenv('ASR_VAD_FLOOR_DBFS', '-50')),
+		pad_s=float(os.getenv('ASR_VAD_PAD_MS', '200')) / 1000.0,
+	)
+	out, out_mime = _encode(trimmed, TARGET_SR)
+	return PreparedAudio(out, out_mime, round(input_seconds, 3), round(trimmed.shape[0] / TARGET_SR, 3))
+
+
+def trim_silence(samples: np.ndarray, sr: int, threshold_db: float = 35.0, floor_dbfs: float = -50.0, pad_s: float = 0.2) -> np.ndarray:
+	"""Energy-based VAD over fixed frames: keep from the first to the last voiced frame, plus padding."""
+	frame = max(1, int(sr * _FRAME_SECONDS))
+	n_frames = samples.shape[0] // frame
+	if n_frames == 0:
+		return samples[:0]
+	frames = samples[:n_frames * frame].reshape(n_frames, frame)
+	rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+	db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+	voiced = np.flatnonzero((db > db.max() - threshold_db) & (db > floor_dbfs))
+	if voiced.size == 0:
+		return samples[:0]
+	pad = int(pad_s * sr)
+	start = max(0, voiced[0] * frame - pad)
+	end = min(samples.shape[0], (voiced[-1] + 1) * frame + pad)
+	return samples[start:end]
+
+
+def _to_mono(samples: np.ndarray) -> np.ndarray:
+	if samples.ndim == 2:
+		samples = samples.mean(axis=1)
+	return samples.astype(np.float32, copy=False)
+
+
+def _resample(samples: np.ndarray, sr: int, target_sr: int) -> np.ndarray:
+	if sr == target_sr or samples.size == 0:
+		return samples
+	if _SCIPY:
+		g = np.gcd(sr, target_sr)
+		return resample_poly(samples, target_sr // g, sr // g).astype(np.float32)
+	n_out = int(round(samples.shape[0] * target_sr / sr))
+	x_out = np.linspace(0, samples.shape[0] - 1, n_out)
+	return np.interp(x_out, np.arange(samples.shape[0]), samples).astype(np.float32)
+
+
+def _decode(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+	"""Decode to float32 samples shaped (frames,) or (frames, channels)."""
+	if _SOUNDFILE:
+		try:
+			samples, sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=False)
+			return samples, sr
+		except Exception:
+			pass
+	if _PYAV:
+		try:
+			return _decode_pyav(data)
+		except Exception:
+			pass
+	if shutil.which('ffmpeg'):
+		try:
+			return _decode_ffmpeg(data)
+		except Exception:
+			pass
+	elif not _PYAV:
+		print("[asr_preprocess] skipped: cannot decode this upload without PyAV (pip install av) or ffmpeg; passing it through untouched")
+		return None
+	print("[asr_preprocess] skipped: could not decode the upload; passing it through untouched")
+	return None
+
+
+def _decode_pyav(data: bytes) -> Tuple[np.ndarray, int]:
+	# Let the resampler produce mono 16 kHz float directly; browsers mostly send Opus in WebM
+	resampler = av.audio.resampler.AudioResampler(format='flt', layout='mono', rate=TARGET_SR)
+	chunks = []
+	with av.open(io.BytesIO(data), mode='r') as container:
+		for frame in container.decode(audio=0):
+			for out in resampler.resample(frame):
+				chunks.append(out.to_ndarray().reshape(-1))
+		for out in resampler.resample(None):
+			chunks.append(out.to_ndarray().reshape(-1))
+	samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+	return samples.astype(np.float32, copy=False), TARGET_SR
+
+
+def _decode_ffmpeg(data: bytes) -> Tuple[np.ndarray, int]:
+	# Pipe in/out so nothing touches disk
+	proc = subprocess.run(
+		['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', 'pipe:0', '-ac', '1', '-ar', str(TARGET_SR), '-f', 'f32le', 'pipe:1'],
+		input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+	)
+	return np.frombuffer(proc.stdout, dtype=np.float32), TARGET_SR
+
+
+def _encode(samples: np.ndarray, sr: int) -> Tuple[bytes, str]:
+	"""FLAC when soundfile is available (lossless, roughly half of PCM16 WAV), otherwise PCM16 WAV."""
+	pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2')
+	buf = io.BytesIO()
+	if _SOUNDFILE:
+		try:
+			sf.write(buf, pcm, sr, format='FLAC', subtype='PCM_16')
+			return buf.getvalue(), 'audio/flac'
+		except Exception:
+			buf = io.BytesIO()
+	with wave.open(buf, 'wb') as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(sr)
+		w.writeframes(pcm.tobytes())
+	return buf.getvalue(), 'audio/wav'
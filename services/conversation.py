@@ -1,32 +1,116 @@
-from typing import Dict, List, Literal, Tuple
-from services.scoring import ScoringEngine
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from services.scoring import DomainTable, ScoringEngine
+from data.matchers import Answer
 from data.questions import Question, load_questions
 import random
-import re
 
 Phase = Literal['greeting', 'registration_present', 'registration_repeat', 'intervening', 'delayed_recall', 'summary', 'done']
 
 
+class SessionState:
+	"""Per-session conversation state. Slotted to keep live sessions small.
+
+	math_subtract / math_add hold the (start, decrement, answer) / (a, b, answer) of the question
+	currently being asked; planned maps question ids to math_subtract parameters drawn ahead of time.
+	"""
+
+	__slots__ = (
+		'phase', 'registration_words', 'user_repeated_words', 'intervening_idx',
+		'delayed_recall_attempt', 'scoring', 'math_subtract', 'math_add', 'planned',
+	)
+
+	def __init__(self, scoring: ScoringEngine) -> None:
+		self.phase: Phase = 'greeting'
+		self.registration_words: Tuple[str, ...] = ()
+		self.user_repeated_words: Tuple[str, ...] = ()
+		self.intervening_idx = 0
+		self.delayed_recall_attempt: Tuple[str, ...] = ()
+		self.scoring = scoring
+		self.math_subtract: Optional[Tuple[int, int, int]] = None
+		self.math_add: Optional[Tuple[int, int, int]] = None
+		self.planned: Optional[Dict[str, Tuple[int, int, int]]] = None
+
+
 class ConversationManager:
+	DELAYED_RECALL_PROMPT = "Now, please tell me the three words I asked you to remember."
+	SUMMARY_PROMPT = "Thanks for completing the check. Here is a quick summary of your results."
+
 	def __init__(self) -> None:
 		self.questions: List[Question] = load_questions()
-
-	def create_session_state(self) -> Dict:
-		return {
-			"phase": 'greeting',
-			"registration_words": [],
-			"user_repeated_words": [],
-			"intervening_idx": 0,
-			"delayed_recall_attempt": [],
-			"scoring": ScoringEngine(),
-			"dynamic": {},
+		# Score slots follow the order domains are first scored during an assessment
+		self.domains = DomainTable(['three_word_registration', *[q.domain for q in self.questions], 'delayed_recall'])
+
+	def create_session_state(self) -> SessionState:
+		return SessionState(ScoringEngine(self.domains))
+
+	def dump_state(self, state: SessionState) -> Dict[str, Any]:
+		"""JSON-serializable form of a session state (for shared session stores)."""
+		out: Dict[str, Any] = {
+			"phase": state.phase,
+			"idx": state.intervening_idx,
+			"words": list(state.registration_words),
+			"scores": state.scoring.to_dict(),
 		}
+		if state.user_repeated_words:
+			out["repeated"] = list(state.user_repeated_words)
+		if state.delayed_recall_attempt:
+			out["recalled"] = list(state.delayed_recall_attempt)
+		if state.math_subtract is not None:
+			out["math_subtract"] = list(state.math_subtract)
+		if state.math_add is not None:
+			out["math_add"] = list(state.math_add)
+		if state.planned:
+			out["planned"] = {qid: list(v) for qid, v in state.planned.items()}
+		return out
+
+	def load_state(self, data: Dict[str, Any]) -> SessionState:
+		state = SessionState(ScoringEngine.from_dict(data.get("scores") or {}, self.domains))
+		state.phase = data.get("phase", 'greeting')
+		state.intervening_idx = int(data.get("idx", 0))
+		state.registration_words = tuple(data.get("words") or ())
+		state.user_repeated_words = tuple(data.get("repeated") or ())
+		state.delayed_recall_attempt = tuple(data.get("recalled") or ())
+		if data.get("math_subtract"):
+			state.math_subtract = tuple(data["math_subtract"])
+		if data.get("math_add"):
+			state.math_add = tuple(data["math_add"])
+		if data.get("planned"):
+			state.planned = {qid: tuple(v) for qid, v in data["planned"].items()}
+		return state
 
 	def get_opening_prompt(self) -> str:
 		return "Hello, I’m your assistant. We’ll do a short memory and thinking check. Ready to begin?"
 
-	def handle_turn(self, state: Dict, user_text: str) -> Dict:
-		phase: Phase = state["phase"]
+	def upcoming_prompts(self, state: SessionState, limit: int) -> List[str]:
+		"""Agent texts still to be spoken in this session, in order, up to limit.
+
+		Dynamic prompts are planned here (and stored in state) so the text is known before the
+		question is reached; _generate_dynamic_prompt later uses the same plan.
+		"""
+		phase: Phase = state.phase
+		out: List[str] = []
+		if phase == 'greeting':
+			out.append(self.get_opening_prompt())
+			out.append(self._registration_prompt(self._choose_registration_words()))
+			start = 0
+		elif phase == 'registration_present':
+			start = 0
+		elif phase == 'intervening':
+			# The prompt for the current index has already been returned to the client
+			start = state.intervening_idx + 1
+		elif phase == 'delayed_recall':
+			return [self.SUMMARY_PROMPT][:limit]
+		else:
+			return []
+		for q in self.questions[start:]:
+			if len(out) >= limit:
+				return out
+			out.append(self._planned_prompt(q, state))
+		out.extend([self.DELAYED_RECALL_PROMPT, self.SUMMARY_PROMPT])
+		return out[:limit]
+
+	def handle_turn(self, state: SessionState, user_text: str) -> Dict:
+		phase: Phase = state.phase
 		if phase == 'greeting':
 			return self._do_registration_present(state)
 		if phase == 'registration_present':
@@ -39,7 +123,7 @@ class ConversationManager:
 			return self._do_delayed_recall(state, user_text)
 		if phase == 'summary':
 			return self._do_summary(state)
-		return {"state": state, "agent_text": "", "phase": 'done', "scores": state['scoring'].snapshot(), "done": True}
+		return {"state": state, "agent_text": "", "phase": 'done', "scores": state.scoring.snapshot(), "done": True}
 
 	def _choose_registration_words(self) -> List[str]:
 		return ["APPLE", "TABLE", "PENNY"]
@@ -47,109 +131,100 @@ class ConversationManager:
 	def _parse_words(self, text: str) -> List[str]:
 		return [w.strip().upper() for w in text.replace(',', ' ').split() if w.strip()]
 
-	def _do_registration_present(self, state: Dict) -> Dict:
+	def _do_registration_present(self, state: SessionState) -> Dict:
 		words = self._choose_registration_words()
-		state["registration_words"] = words
-		state["phase"] = 'registration_present'
-		agent = f"Please remember these three words: {', '.join(words)}. Now, please repeat them back to me."
-		return {"state": state, "agent_text": agent, "phase": state['phase'], "scores": state['scoring'].snapshot(), "done": False}
+		state.registration_words = tuple(words)
+		state.phase = 'registration_present'
+		agent = self._registration_prompt(words)
+		return {"state": state, "agent_text": agent, "phase": state.phase, "scores": state.scoring.snapshot(), "done": False}
 
-	def _do_registration_repeat(self, state: Dict, user_text: str) -> Dict:
-		user_words = self._parse_words(user_text)
-		state["user_repeated_words"] = user_words
-		correct = sum(1 for w in state['registration_words'] if w in user_words)
-		state['scoring'].add_three_word_registration(correct)
-		state['phase'] = 'intervening'
-		return self._prompt_next_intervening(state)
+	def _registration_prompt(self, words: List[str]) -> str:
+		return f"Please remember these three words: {', '.join(words)}. Now, please repeat them back to me."
 
-	def _generate_dynamic_prompt(self, q: Question, state: Dict) -> str:
+	def score_word_recall(self, words: Tuple[str, ...], user_text: str) -> int:
+		"""How many of the registration words appear in the answer (registration and delayed recall)."""
+		user_words = self._parse_words(user_text)
+		return sum(1 for w in words if w in user_words)
+
+	def _scored(self, result: Dict, question_id: str, points: int, max_points: int, context: Optional[Any] = None) -> Dict:
+		# What this turn scored, so transcripts can be logged and later re-scored offline (scripts/rescore.py)
+		result["scored"] = {"question_id": question_id, "points": points, "max_points": max_points, "context": context}
+		return result
+
+	def _do_registration_repeat(self, state: SessionState, user_text: str) -> Dict:
+		state.user_repeated_words = tuple(self._parse_words(user_text))
+		correct = self.score_word_recall(state.registration_words, user_text)
+		state.scoring.add_three_word_registration(correct)
+		state.phase = 'intervening'
+		return self._scored(self._prompt_next_intervening(state), 'three_word_registration', correct, 3, list(state.registration_words))
+
+	def _plan_math_subtract(self, q: Question) -> Tuple[int, int, int]:
+		params = q.params or {}
+		start_min = int(params.get('start_min', 90))
+		start_max = int(params.get('start_max', 120))
+		decrement = int(params.get('decrement', 7))
+		start = random.randint(start_min, start_max)
+		return (start, decrement, start - decrement)
+
+	def _planned_prompt(self, q: Question, state: SessionState) -> str:
+		"""Prompt text for q without advancing the conversation; random parameters are fixed in state."""
 		if q.qtype == 'math_subtract':
-			params = q.params or {}
-			start_min = int(params.get('start_min', 90))
-			start_max = int(params.get('start_max', 120))
-			decrement = int(params.get('decrement', 7))
-			start = random.randint(start_min, start_max)
-			state['dynamic']['math'] = {"start": start, "decrement": decrement, "answer": start - decrement}
+			if state.planned is None:
+				state.planned = {}
+			if q.id not in state.planned:
+				state.planned[q.id] = self._plan_math_subtract(q)
+			start, decrement, _ = state.planned[q.id]
 			return f"Please subtract {decrement} from {start} and tell me the result."
+		return q.prompt
+
+	def _generate_dynamic_prompt(self, q: Question, state: SessionState) -> str:
+		if q.qtype == 'math_subtract':
+			prompt = self._planned_prompt(q, state)
+			state.math_subtract = state.planned.pop(q.id)
+			if not state.planned:
+				state.planned = None
+			return prompt
 		if q.qtype == 'math_add':
 			params = q.params or {}
 			a = int(params.get('a', 0))
 			b = int(params.get('b', 0))
-			state['dynamic']['math_add'] = {"a": a, "b": b, "answer": a + b}
+			state.math_add = (a, b, a + b)
 			return q.prompt
 		return q.prompt
 
-	def _score_dynamic_answer(self, q: Question, state: Dict, user_text: str) -> int:
-		if q.qtype == 'math_subtract':
-			cfg = state.get('dynamic', {}).get('math', {})
-			try:
-				expected = int(cfg.get('answer', 0))
-				m = re.search(r"-?\d+", user_text)
-				if m and int(m.group(0)) == expected:
-					return q.max_points
-			except Exception:
-				return 0
-		if q.qtype == 'math_add':
-			cfg = state.get('dynamic', {}).get('math_add', {})
-			try:
-				expected = int(cfg.get('answer', 0))
-				m = re.search(r"-?\d+", user_text)
-				if m and int(m.group(0)) == expected:
-					return q.max_points
-				return 0
-			except Exception:
-				return 0
-		if q.qtype == 'repeat_digits':
-			params = q.params or {}
-			expected = [str(d) for d in params.get('sequence', [])]
-			spoken = [tok for tok in re.findall(r"\d+", user_text)]
-			# score equals count of expected digits present in any order, up to max_points
-			correct = sum(1 for d in expected if d in spoken)
-			return min(correct, q.max_points)
-		if q.qtype == 'yes_no':
-			val = user_text.strip().lower()
-			is_yes = any(w in val for w in ["yes", "yeah", "yep", "ya", "sure"]) and not any(w in val for w in ["no", "nope"])
-			expected_yes = str((q.params or {}).get('expected', 'yes')).lower() in ['yes', 'true', '1']
-			return q.max_points if (is_yes == expected_yes) else 0
-		if q.qtype == 'free_speech_min_words':
-			min_words = int((q.params or {}).get('min_words', 5))
-			count = len([w for w in re.findall(r"\w+", user_text)])
-			return q.max_points if count >= min_words else 0
-		if q.qtype == 'planning_keywords':
-			keywords = [str(k).upper() for k in (q.params or {}).get('keywords', [])]
-			text_upper = user_text.upper()
-			count = sum(1 for k in keywords if k in text_upper)
-			return min(count, q.max_points)
-		return q.score_response(user_text)
-
-	def _prompt_next_intervening(self, state: Dict) -> Dict:
-		i = state['intervening_idx']
+	def _score_dynamic_answer(self, q: Question, state: SessionState, user_text: str) -> int:
+		# Each question carries a matcher compiled at load time; the answer is tokenized once here
+		return q.score(Answer(user_text), state)
+
+	def _prompt_next_intervening(self, state: SessionState) -> Dict:
+		i = state.intervening_idx
 		if i >= len(self.questions):
-			state['phase'] = 'delayed_recall'
-			return {"state": state, "agent_text": "Now, please tell me the three words I asked you to remember.", "phase": state['phase'], "scores": state['scoring'].snapshot(), "done": False}
+			state.phase = 'delayed_recall'
+			return {"state": state, "agent_text": self.DELAYED_RECALL_PROMPT, "phase": state.phase, "scores": state.scoring.snapshot(), "done": False}
 		q = self.questions[i]
 		prompt = self._generate_dynamic_prompt(q, state)
-		return {"state": state, "agent_text": prompt, "phase": state['phase'], "scores": state['scoring'].snapshot(), "done": False}
-
-	def _do_intervening(self, state: Dict, user_text: str) -> Dict:
-		i = state['intervening_idx']
-		if i < len(self.questions):
-			q = self.questions[i]
-			points = self._score_dynamic_answer(q, state, user_text)
-			state['scoring'].add_score(q.domain, points, q.max_points)
-			state['intervening_idx'] = i + 1
-		return self._prompt_next_intervening(state)
-
-	def _do_delayed_recall(self, state: Dict, user_text: str) -> Dict:
-		user_words = self._parse_words(user_text)
-		state['delayed_recall_attempt'] = user_words
-		correct = sum(1 for w in state['registration_words'] if w in user_words)
-		state['scoring'].add_three_word_recall(correct)
-		state['phase'] = 'summary'
-		return self._do_summary(state)
-
-	def _do_summary(self, state: Dict) -> Dict:
-		snapshot = state['scoring'].snapshot()
-		state['phase'] = 'done'
-		agent = "Thanks for completing the check. Here is a quick summary of your results."
+		return {"state": state, "agent_text": prompt, "phase": state.phase, "scores": state.scoring.snapshot(), "done": False}
+
+	def _do_intervening(self, state: SessionState, user_text: str) -> Dict:
+		i = state.intervening_idx
+		if i >= len(self.questions):
+			return self._prompt_next_intervening(state)
+		q = self.questions[i]
+		points = self._score_dynamic_answer(q, state, user_text)
+		state.scoring.add_score(q.domain, points, q.max_points)
+		state.intervening_idx = i + 1
+		context = getattr(state, q.qtype) if q.qtype in ('math_subtract', 'math_add') else None
+		return self._scored(self._prompt_next_intervening(state), q.id, points, q.max_points, list(context) if context else None)
+
+	def _do_delayed_recall(self, state: SessionState, user_text: str) -> Dict:
+		state.delayed_recall_attempt = tuple(self._parse_words(user_text))
+		correct = self.score_word_recall(state.registration_words, user_text)
+		state.scoring.add_three_word_recall(correct)
+		state.phase = 'summary'
+		return self._scored(self._do_summary(state), 'delayed_recall', correct, 3, list(state.registration_words))
+
+	def _do_summary(self, state: SessionState) -> Dict:
+		snapshot = state.scoring.snapshot()
+		state.phase = 'done'
+		agent = self.SUMMARY_PROMPT
 		return {"state": state, "agent_text": agent, "phase": 'summary', "scores": snapshot, "done": True} 
\ No newline at end of file
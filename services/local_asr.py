@@ -0,0 +1,181 @@
+import io
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+	from faster_whisper import WhisperModel, decode_audio  # type: ignore
+	from faster_whisper.audio import pad_or_trim  # type: ignore
+	from faster_whisper.tokenizer import Tokenizer  # type: ignore
+	_WHISPER_AVAILABLE = True
+except Exception:
+	_WHISPER_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+# Whisper decodes fixed 30 s windows; anything shorter can share a batched decode pass
+_WINDOW_SECONDS = 30.0
+
+
+class _Job:
+	__slots__ = ("audio", "future", "enqueued_at")
+
+	def __init__(self, audio: np.ndarray) -> None:
+		self.audio = audio
+		self.future: Future = Future()
+		self.enqueued_at = time.perf_counter()
+
+
+class LocalWhisperASR:
+	"""Offline CPU transcription with faster-whisper (CTranslate2).
+
+	The model is loaded once at construction. Short utterances (< 30 s) from concurrent callers are
+	collected for up to LOCAL_ASR_BATCH_WINDOW_MS and decoded in one batched encoder/generate pass;
+	longer audio is transcribed on its own. Per-utterance real-time factor (processing time / audio
+	duration) is tracked.
+
+	Environment variables:
+	- LOCAL_ASR_MODEL: faster-whisper model name or path (default: base.en)
+	- LOCAL_ASR_COMPUTE_TYPE: CTranslate2 compute type (default: int8)
+	- LOCAL_ASR_THREADS: CPU threads per decode (default: 0 = library default)
+	- LOCAL_ASR_LANGUAGE: decode language (default: en)
+	- LOCAL_ASR_BATCH_WINDOW_MS: batching window (default: 20)
+	- LOCAL_ASR_MAX_BATCH: max utterances per decode pass (default: 8)
+	"""
+
+	def __init__(self) -> None:
+		if not _WHISPER_AVAILABLE:
+			raise RuntimeError("faster-whisper is not installed")
+		self.model_name = os.getenv('LOCAL_ASR_MODEL', 'base.en')
+		self.language = os.getenv('LOCAL_ASR_LANGUAGE', 'en')
+		self.window_s = float(os.getenv('LOCAL_ASR_BATCH_WINDOW_MS', '20')) / 1000.0
+		self.max_batch = max(1, int(os.getenv('LOCAL_ASR_MAX_BATCH', '8')))
+		started = time.perf_counter()
+		self.model = WhisperModel(
+			self.model_name,
+			device='cpu',
+			compute_type=os.getenv('LOCAL_ASR_COMPUTE_TYPE', 'int8'),
+			cpu_threads=int(os.getenv('LOCAL_ASR_THREADS', '0')),
+		)
+		self.load_seconds = time.perf_counter() - started
+		self.tokenizer = Tokenizer(
+			self.model.hf_tokenizer,
+			self.model.model.is_multilingual,
+			task='transcribe',
+			language=self.language if self.model.model.is_multilingual else None,
+		)
+		self._prompt = list(self.tokenizer.sot_sequence) + [self.tokenizer.no_timestamps]
+		self._queue: "queue.Queue[_Job]" = queue.Queue()
+		self._stats_lock = threading.Lock()
+		self._rtf: "deque[float]" = deque(maxlen=256)
+		self.batches = 0
+		self.utterances = 0
+		self._thread = threading.Thread(target=self._loop, name='local-asr', daemon=True)
+		self._thread.start()
+
+	def transcribe(self, audio_bytes: bytes) -> str:
+		audio = decode_audio(io.BytesIO(audio_bytes), sampling_rate=SAMPLE_RATE)
+		if audio.size == 0:
+			return ""
+		job = _Job(audio)
+		self._queue.put(job)
+		return job.future.result()
+
+	def _collect(self) -> List[_Job]:
+		batch = [self._queue.get()]
+		deadline = time.perf_counter() + self.window_s
+		while len(batch) < self.max_batch:
+			remaining = deadline - time.perf_counter()
+			try:
+				batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+			except queue.Empty:
+				break
+		return batch
+
+	def _loop(self) -> None:
+		while True:
+			batch = self._collect()
+			short = [j for j in batch if j.audio.shape[0] < _WINDOW_SECONDS * SAMPLE_RATE]
+			long = [j for j in batch if j.audio.shape[0] >= _WINDOW_SECONDS * SAMPLE_RATE]
+			if short:
+				self._decode_batch(short)
+			for job in long:
+				self._decode_single(job)
+
+	def _decode_batch(self, jobs: List[_Job]) -> None:
+		started = time.perf_counter()
+		try:
+			features = np.stack([
+				pad_or_trim(self.model.feature_extractor(job.audio)).astype(np.float32)
+				for job in jobs
+			])
+			encoded = self.model.encode(features)
+			results = self.model.model.generate(
+				encoded,
+				[self._prompt] * len(jobs),
+				beam_size=1,
+				max_length=448,
+				suppress_blank=True,
+			)
+		except Exception:
+			print("[local-asr] batched decode failed, falling back:\n" + traceback.format_exc())
+			for job in jobs:
+				self._decode_single(job)
+			return
+		elapsed = time.perf_counter() - started
+		with self._stats_lock:
+			self.batches += 1
+		for job, result in zip(jobs, results):
+			tokens = [t for t in result.sequences_ids[0] if t < self.tokenizer.eot]
+			self._finish(job, self.tokenizer.decode(tokens).strip(), elapsed)
+
+	def _decode_single(self, job: _Job) -> None:
+		started = time.perf_counter()
+		try:
+			segments, _ = self.model.transcribe(job.audio, language=self.language, beam_size=1)
+			text = " ".join(s.text.strip() for s in segments).strip()
+		except Exception as e:
+			job.future.set_exception(e)
+			return
+		with self._stats_lock:
+			self.batches += 1
+		self._finish(job, text, time.perf_counter() - started)
+
+	def _finish(self, job: _Job, text: str, elapsed: float) -> None:
+		duration = job.audio.shape[0] / SAMPLE_RATE
+		with self._stats_lock:
+			self.utterances += 1
+			if duration > 0:
+				self._rtf.append(elapsed / duration)
+		job.future.set_result(text)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._stats_lock:
+			rtf = list(self._rtf)
+			return {
+				"model": self.model_name,
+				"load_seconds": round(self.load_seconds, 3),
+				"queue_depth": self._queue.qsize(),
+				"batches": self.batches,
+				"utterances": self.utterances,
+				"last_rtf": round(rtf[-1], 4) if rtf else None,
+				"mean_rtf": round(sum(rtf) / len(rtf), 4) if rtf else None,
+			}
+
+
+def local_asr_available() -> bool:
+	return _WHISPER_AVAILABLE
+
+
+def create_local_asr() -> Optional[LocalWhisperASR]:
+	try:
+		return LocalWhisperASR()
+	except Exception:
+		print("[local-asr] unavailable:\n" + traceback.format_exc())
+		return None
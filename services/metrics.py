@@ -0,0 +1,246 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from cache hits to full synthesis
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+	"""Fixed-bucket histogram (cumulative counts per upper bound, Prometheus style).
+
+	With label names, each combination of label values passed to observe() is its own series.
+	"""
+
+	def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS, labels: Sequence[str] = ()) -> None:
+		self.name = name
+		self.description = description
+		self.buckets = sorted(buckets)
+		self.labels = tuple(labels)
+		self._series: Dict[Tuple[str, ...], List[Any]] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, *label_values: str) -> None:
+		i = bisect_left(self.buckets, value)
+		with self._lock:
+			series = self._series.get(label_values)
+			if series is None:
+				# [per-bucket counts (+Inf last), count, sum]
+				series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+			series[0][i] += 1
+			series[1] += 1
+			series[2] += value
+
+	def snapshot(self, *label_values: str) -> Dict[str, Any]:
+		with self._lock:
+			counts, count, total = self._series.get(label_values) or [[0] * (len(self.buckets) + 1), 0, 0.0]
+			cumulative, running = {}, 0
+			for bound, n in zip(self.buckets + [float('inf')], counts):
+				running += n
+				cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+			return {"buckets": cumulative, "count": count, "sum": round(total, 6)}
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+		for label_values, (counts, count, total) in series:
+			labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+			sep = ',' if labels else ''
+			running = 0
+			for bound, n in zip(self.buckets + [float('inf')], counts):
+				running += n
+				le = '+Inf' if bound == float('inf') else repr(float(bound))
+				lines.append(f'{self.name}_bucket{{{labels}{sep}le="{le}"}} {running}')
+			suffix = f'{{{labels}}}' if labels else ''
+			lines.append(f"{self.name}_sum{suffix} {total!r}")
+			lines.append(f"{self.name}_count{suffix} {count}")
+		return lines
+
+
+def _escape(value: str) -> str:
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestTimer:
+	"""Stage durations of one request, reported in its Server-Timing header."""
+
+	__slots__ = ('started', 'stages', 'profiler', '_token')
+
+	def __init__(self) -> None:
+		self.started = time.perf_counter()
+		self.stages: List[Tuple[str, float]] = []
+		self.profiler: Optional[cProfile.Profile] = None
+		self._token = None
+
+	def add(self, name: str, seconds: float) -> None:
+		self.stages.append((name, seconds))
+
+	def server_timing(self, total: float) -> str:
+		# Repeated stages (e.g. two user-store reads) are summed into one entry
+		merged: Dict[str, float] = {}
+		for name, seconds in self.stages:
+			merged[name] = merged.get(name, 0.0) + seconds
+		parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items()]
+		parts.append(f"total;dur={total * 1000:.2f}")
+		return ', '.join(parts)
+
+
+_current: ContextVar[Optional[RequestTimer]] = ContextVar('request_timer', default=None)
+
+
+def current_timer() -> Optional[RequestTimer]:
+	return _current.get()
+
+
+class _Stage:
+	__slots__ = ('histogram', 'name', 'started')
+
+	def __init__(self, histogram: Histogram, name: str) -> None:
+		self.histogram = histogram
+		self.name = name
+
+	def __enter__(self) -> '_Stage':
+		self.started = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		elapsed = time.perf_counter() - self.started
+		self.histogram.observe(elapsed, self.name)
+		timer = _current.get()
+		if timer is not None:
+			timer.add(self.name, elapsed)
+
+
+class Metrics:
+	"""Per-service stage and request histograms, exported in Prometheus text format by render().
+
+	Wrap hot-path work in `with metrics.stage('name'):`; outside a request the duration only goes
+	to the histogram. begin()/end() bracket a request and produce its Server-Timing header. Both
+	cost a few perf_counter() calls and a short lock, so they stay on in production.
+
+	A sampled profile covers the thread the request began on. In the Flask app that thread belongs to
+	the request. In the ASGI services (xtts_server, app_async) it is the event loop, so the profile
+	also holds every request running at the same time, and work sent to the threadpool is missing.
+	It is still filed under the sampled request's route.
+
+	Environment variables:
+	- PROFILE_SAMPLE_RATE: fraction of requests run under cProfile (default: 0, off)
+	- PROFILE_DIR: where sampled profiles are written as <ms>-<route>.prof (default: profiles)
+	"""
+
+	def __init__(self, prefix: str) -> None:
+		self.prefix = prefix
+		self.stage_seconds = Histogram(f"{prefix}_stage_seconds", 'Time spent in each request stage.', labels=('stage',))
+		self.request_seconds = Histogram(f"{prefix}_request_seconds", 'Request latency until the response headers.', labels=('method', 'route', 'status'))
+		self._histograms: List[Histogram] = [self.stage_seconds, self.request_seconds]
+		self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+		self.sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+		self.profile_dir = os.getenv('PROFILE_DIR', 'profiles')
+
+	def register(self, *histograms: Histogram) -> None:
+		self._histograms.extend(histograms)
+
+	def gauge(self, name: str, description: str, fn: Callable[[], float]) -> None:
+		"""A value read at scrape time (queue depth, cache size, ...)."""
+		self._gauges.append((f"{self.prefix}_{name}", description, fn))
+
+	def stage(self, name: str) -> _Stage:
+		return _Stage(self.stage_seconds, name)
+
+	def begin(self) -> RequestTimer:
+		timer = RequestTimer()
+		timer._token = _current.set(timer)
+		if self.sample_rate > 0 and random.random() < self.sample_rate:
+			profiler = cProfile.Profile()
+			try:
+				profiler.enable()
+				timer.profiler = profiler
+			except ValueError:
+				# Another profiler is active (one request at a time on some Python versions)
+				pass
+		return timer
+
+	def end(self, timer: RequestTimer, method: str, route: str, status: int) -> str:
+		"""Record the request and return its Server-Timing header value."""
+		total = time.perf_counter() - timer.started
+		if timer.profiler is not None:
+			timer.profiler.disable()
+			self._dump_profile(timer.profiler, route)
+			timer.profiler = None
+		if timer._token is not None:
+			try:
+				_current.reset(timer._token)
+			except ValueError:
+				# Ended from a different context than it began in; nothing to restore
+				pass
+			timer._token = None
+		self.request_seconds.observe(total, method, route, str(status))
+		return timer.server_timing(total)
+
+	def _dump_profile(self, profiler: cProfile.Profile, route: str) -> None:
+		try:
+			os.makedirs(self.profile_dir, exist_ok=True)
+			slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+			profiler.dump_stats(os.path.join(self.profile_dir, f"{int(time.time() * 1000)}-{slug}.prof"))
+		except OSError as e:
+			print(f"[metrics] could not write profile: {e}")
+
+	def render(self) -> str:
+		lines: List[str] = []
+		for histogram in self._histograms:
+			lines.extend(histogram.render())
+		for name, description, fn in self._gauges:
+			try:
+				value = float(fn())
+			except Exception:
+				continue
+			lines.extend([f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value!r}"])
+		return '\n'.join(lines) + '\n'
+
+
+class TimingMiddleware:
+	"""ASGI middleware that times each HTTP request and adds its Server-Timing header.
+
+	Plain ASGI rather than BaseHTTPMiddleware, so response bodies are passed through unbuffered.
+	"""
+
+	def __init__(self, app: Any, metrics: Metrics, timing_allow_origin: Optional[str] = None) -> None:
+		self.app = app
+		self.metrics = metrics
+		self.extra_headers: List[Tuple[bytes, bytes]] = []
+		if timing_allow_origin:
+			self.extra_headers.append((b"timing-allow-origin", timing_allow_origin.encode("latin-1")))
+
+	async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		timer = self.metrics.begin()
+		ended = False
+
+		def route() -> str:
+			return getattr(scope.get("route"), "path", None) or "unmatched"
+
+		async def send_with_timing(message: Dict[str, Any]) -> None:
+			nonlocal ended
+			if message["type"] == "http.response.start" and not ended:
+				ended = True
+				header = self.metrics.end(timer, scope["method"], route(), message["status"])
+				message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("latin-1")), *self.extra_headers]}
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_with_timing)
+		finally:
+			if not ended:
+				self.metrics.end(timer, scope["method"], route(), 500)
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+
+from services.audio_cache import UtteranceCache, utterance_key
+
+
+class PromptPrefetcher:
+	"""Synthesizes a session's upcoming prompts in the background so /speak is served from the cache.
+
+	A single executor is shared by all sessions, which caps concurrent prefetch jobs globally.
+	Each session keeps at most `ahead` prompts scheduled. Sessions with the same voice and prompt
+	share one job, which is counted per session: rescheduling or cancelling a session drops only
+	the queued (not yet started) jobs no other session still wants.
+
+	Environment variables:
+	- TTS_PREFETCH_CONCURRENCY: max concurrent prefetch syntheses across sessions (default: 2, 0 disables)
+	- TTS_PREFETCH_AHEAD: how many upcoming prompts to keep synthesized per session (default: 3)
+	"""
+
+	def __init__(self, synthesize: Callable[[str, str], bytes], cache: UtteranceCache, max_workers: Optional[int] = None, ahead: Optional[int] = None) -> None:
+		self._synthesize = synthesize
+		self._cache = cache
+		self.max_workers = max_workers if max_workers is not None else int(os.getenv('TTS_PREFETCH_CONCURRENCY', '2'))
+		self.ahead = ahead if ahead is not None else int(os.getenv('TTS_PREFETCH_AHEAD', '3'))
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tts-prefetch') if self.max_workers > 0 else None
+		# Re-entrant: Future callbacks may run synchronously while the lock is held (cancel/submit)
+		self._lock = threading.RLock()
+		self._inflight: Dict[str, Future] = {}
+		self._session_keys: Dict[str, Set[str]] = {}
+		# utterance key -> number of sessions that have it scheduled
+		self._refs: Dict[str, int] = {}
+		self.stats: Dict[str, int] = {"scheduled": 0, "completed": 0, "skipped": 0, "failed": 0, "cancelled": 0}
+
+	@property
+	def enabled(self) -> bool:
+		return self._executor is not None and self.ahead > 0
+
+	def schedule(self, session_id: str, voice_id: Optional[str], texts: List[str]) -> None:
+		"""Replace the session's pending work with the next `ahead` prompts for voice_id."""
+		if not self.enabled or not voice_id:
+			return
+		with self._lock:
+			# Take the new references before dropping the old ones, so prompts kept across the
+			# reschedule are not cancelled and queued again
+			keys: Set[str] = set()
+			for text in texts[:self.ahead]:
+				key = utterance_key(voice_id, text)
+				if key in keys:
+					continue
+				keys.add(key)
+				self._refs[key] = self._refs.get(key, 0) + 1
+				if key in self._inflight:
+					continue
+				future = self._executor.submit(self._run, key, voice_id, text)
+				self._inflight[key] = future
+				future.add_done_callback(lambda f, k=key: self._done(k, f))
+				self.stats['scheduled'] += 1
+			self._release(self._session_keys.pop(session_id, set()))
+			self._session_keys[session_id] = keys
+
+	def cancel(self, session_id: str) -> None:
+		"""Stop queued prefetches for a session; jobs already synthesizing run to completion."""
+		with self._lock:
+			self._release(self._session_keys.pop(session_id, set()))
+
+	def _release(self, keys: Set[str]) -> None:
+		# Caller holds the lock; a queued job is cancelled once no session references it
+		for key in keys:
+			refs = self._refs.get(key, 0) - 1
+			if refs > 0:
+				self._refs[key] = refs
+				continue
+			self._refs.pop(key, None)
+			future = self._inflight.get(key)
+			if future is not None and future.cancel():
+				self.stats['cancelled'] += 1
+
+	def wait(self, voice_id: str, text: str, timeout: float) -> Optional[bytes]:
+		"""If this utterance is being prefetched, wait for it rather than synthesizing it twice."""
+		key = utterance_key(voice_id, text)
+		with self._lock:
+			future = self._inflight.get(key)
+		if future is None:
+			return None
+		try:
+			return future.result(timeout=timeout)
+		except Exception:
+			return None
+
+	async def wait_async(self, voice_id: str, text: str, timeout: float) -> Optional[bytes]:
+		"""wait() for the async app; timing out or being cancelled leaves the prefetch itself running."""
+		key = utterance_key(voice_id, text)
+		with self._lock:
+			future = self._inflight.get(key)
+		if future is None:
+			return None
+		try:
+			return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+		except Exception:
+			return None
+
+	def _run(self, key: str, voice_id: str, text: str) -> Optional[bytes]:
+		with self._lock:
+			# Every session that wanted it went away between dequeue and start
+			if key not in self._refs:
+				self.stats['cancelled'] += 1
+				return None
+		if self._cache.contains(key):
+			with self._lock:
+				self.stats['skipped'] += 1
+			return None
+		try:
+			data = self._synthesize(text, voice_id)
+		except Exception:
+			print("[prefetch] synthesis failed:\n" + traceback.format_exc())
+			with self._lock:
+				self.stats['failed'] += 1
+			return None
+		self._cache.put(key, data)
+		with self._lock:
+			self.stats['completed'] += 1
+		return data
+
+	def _done(self, key: str, future: Future) -> None:
+		with self._lock:
+			if self._inflight.get(key) is future:
+				del self._inflight[key]
+
+	def info(self) -> Dict[str, int]:
+		with self._lock:
+			return {**self.stats, "inflight": len(self._inflight), "sessions": len(self._session_keys)}
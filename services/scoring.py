@@ -1,42 +1,77 @@
-from dataclasses import dataclass, field
-from typing import Dict, Tuple
-
-
-@dataclass
-class DomainScore:
-	scored_points: int = 0
-	max_points: int = 0
-
-	def add(self, points: int, max_points: int) -> None:
-		self.scored_points += max(0, points)
-		self.max_points += max(0, max_points)
-
-	@property
-	def percent(self) -> float:
-		if self.max_points == 0:
-			return 0.0
-		return (self.scored_points / self.max_points) * 100.0
-
-	@property
-	def category(self) -> str:
-		p = self.percent
-		if p >= 85:
-			return 'Excellent'
-		if p >= 70:
-			return 'Good'
-		if p >= 50:
-			return 'Fair'
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _category(points: int, max_points: int) -> str:
+	if max_points == 0:
 		return 'Needs Attention'
+	percent = (points / max_points) * 100.0
+	if percent >= 85:
+		return 'Excellent'
+	if percent >= 70:
+		return 'Good'
+	if percent >= 50:
+		return 'Fair'
+	return 'Needs Attention'
+
+
+class DomainTable:
+	"""Maps domain names to fixed array slots; built once from the question bank and shared.
+
+	Unknown domains are appended on first use, so engines created earlier grow their arrays lazily.
+	"""
+
+	__slots__ = ('names', 'index')
+
+	def __init__(self, names: Iterable[str] = ()) -> None:
+		self.names: List[str] = []
+		self.index: Dict[str, int] = {}
+		for name in names:
+			self.slot(name)
+
+	def slot(self, name: str) -> int:
+		i = self.index.get(name)
+		if i is None:
+			i = len(self.names)
+			self.names.append(name)
+			self.index[name] = i
+		return i
+
+	def __len__(self) -> int:
+		return len(self.names)
+
+
+_DEFAULT_TABLE = DomainTable()
 
 
-@dataclass
 class ScoringEngine:
-	domains: Dict[str, DomainScore] = field(default_factory=dict)
+	"""Per-session scores kept in flat int arrays indexed by a shared DomainTable.
+
+	snapshot() is cached and only rebuilt after a score changes; the returned dict is shared
+	between calls and must not be mutated.
+	"""
+
+	__slots__ = ('table', 'points', 'max_points', 'touched', '_snapshot')
+
+	def __init__(self, table: Optional[DomainTable] = None) -> None:
+		self.table = table if table is not None else _DEFAULT_TABLE
+		n = len(self.table)
+		self.points = array('i', bytes(4 * n))
+		self.max_points = array('i', bytes(4 * n))
+		# Bitmask of slots that have been scored (snapshots only list those)
+		self.touched = 0
+		self._snapshot: Optional[Dict[str, Dict[str, float | int | str]]] = None
 
 	def add_score(self, domain: str, points: int, max_points: int) -> None:
-		if domain not in self.domains:
-			self.domains[domain] = DomainScore()
-		self.domains[domain].add(points, max_points)
+		i = self.table.slot(domain)
+		if i >= len(self.points):
+			grow = len(self.table) - len(self.points)
+			self.points.extend([0] * grow)
+			self.max_points.extend([0] * grow)
+		self.points[i] += max(0, points)
+		self.max_points[i] += max(0, max_points)
+		self.touched |= 1 << i
+		self._snapshot = None
 
 	def add_three_word_registration(self, correct: int) -> None:
 		self.add_score('three_word_registration', correct, 3)
@@ -44,14 +79,20 @@ class ScoringEngine:
 	def add_three_word_recall(self, correct: int) -> None:
 		self.add_score('delayed_recall', correct, 3)
 
+	def _slots(self) -> List[int]:
+		return [i for i in range(len(self.points)) if self.touched >> i & 1]
+
 	def snapshot(self) -> Dict[str, Dict[str, float | int | str]]:
+		if self._snapshot is not None:
+			return self._snapshot
 		out: Dict[str, Dict[str, float | int | str]] = {}
-		for domain, score in self.domains.items():
-			out[domain] = {
-				"points": score.scored_points,
-				"max_points": score.max_points,
-				"percent": round(score.percent, 2),
-				"category": score.category,
+		for i in self._slots():
+			points, max_points = self.points[i], self.max_points[i]
+			out[self.table.names[i]] = {
+				"points": points,
+				"max_points": max_points,
+				"percent": round((points / max_points) * 100.0, 2) if max_points else 0.0,
+				"category": _category(points, max_points),
 			}
 		# overall
 		total_points, total_max = self._overall()
@@ -59,23 +100,21 @@ class ScoringEngine:
 			"points": total_points,
 			"max_points": total_max,
 			"percent": round((total_points / total_max) * 100.0, 2) if total_max else 0.0,
-			"category": self._category(total_points, total_max),
+			"category": _category(total_points, total_max),
 		}
+		self._snapshot = out
 		return out
 
+	def to_dict(self) -> Dict[str, List[int]]:
+		"""Compact form: {domain: [scored_points, max_points]}."""
+		return {self.table.names[i]: [self.points[i], self.max_points[i]] for i in self._slots()}
+
+	@classmethod
+	def from_dict(cls, data: Dict[str, List[int]], table: Optional[DomainTable] = None) -> 'ScoringEngine':
+		engine = cls(table)
+		for domain, v in (data or {}).items():
+			engine.add_score(domain, int(v[0]), int(v[1]))
+		return engine
+
 	def _overall(self) -> Tuple[int, int]:
-		total_points = sum(d.scored_points for d in self.domains.values())
-		total_max = sum(d.max_points for d in self.domains.values())
-		return total_points, total_max
-
-	def _category(self, points: int, max_points: int) -> str:
-		if max_points == 0:
-			return 'Needs Attention'
-		percent = (points / max_points) * 100.0
-		if percent >= 85:
-			return 'Excellent'
-		if percent >= 70:
-			return 'Good'
-		if percent >= 50:
-			return 'Fair'
-		return 'Needs Attention' 
\ No newline at end of file
+		return sum(self.points), sum(self.max_points)
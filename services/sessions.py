@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SessionCodec:
+	"""Converts a session record ({"voice_id", "user_id", "state"}) to and from compact JSON."""
+
+	def __init__(self, dump_state: Callable[[Any], Any], load_state: Callable[[Any], Any]) -> None:
+		self.dump_state = dump_state
+		self.load_state = load_state
+
+	def encode(self, record: Dict[str, Any]) -> str:
+		out = dict(record)
+		out['state'] = self.dump_state(record['state'])
+		return json.dumps(out, separators=(',', ':'), ensure_ascii=False)
+
+	def decode(self, raw: str) -> Dict[str, Any]:
+		record = json.loads(raw)
+		record['state'] = self.load_state(record['state'])
+		return record
+
+
+class _SweepingStore(ABC):
+	"""Shared TTL bookkeeping: a daemon thread periodically calls sweep() to drop expired sessions."""
+
+	def __init__(self, ttl_s: float, sweep_s: float, on_evict: Optional[Callable[[str], None]]) -> None:
+		self.ttl_s = ttl_s
+		self.on_evict = on_evict
+		self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+		self._stats_lock = threading.Lock()
+		if sweep_s > 0:
+			t = threading.Thread(target=self._sweep_loop, args=(sweep_s,), name='session-sweeper', daemon=True)
+			t.start()
+
+	def _sweep_loop(self, interval: float) -> None:
+		while True:
+			time.sleep(interval)
+			try:
+				self.sweep()
+			except Exception:
+				pass
+
+	def _count(self, key: str, n: int = 1) -> None:
+		with self._stats_lock:
+			self.stats[key] += n
+
+	def _evicted(self, session_id: str) -> None:
+		if self.on_evict is not None:
+			try:
+				self.on_evict(session_id)
+			except Exception:
+				pass
+
+	@abstractmethod
+	def sweep(self) -> int:
+		"""Drop expired sessions; returns how many were removed."""
+
+
+class MemorySessionStore(_SweepingStore):
+	"""Process-local LRU with a TTL that is refreshed on every access."""
+
+	def __init__(self, ttl_s: float, max_sessions: int, sweep_s: float = 60.0, on_evict: Optional[Callable[[str], None]] = None) -> None:
+		self.max_sessions = max(1, max_sessions)
+		self._lock = threading.Lock()
+		self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+		super().__init__(ttl_s, sweep_s, on_evict)
+
+	def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+		if not session_id:
+			return None
+		now = time.monotonic()
+		with self._lock:
+			item = self._items.get(session_id)
+			if item is not None and item[0] < now:
+				del self._items[session_id]
+				expired, item = True, None
+			else:
+				expired = False
+			if item is not None:
+				self._items[session_id] = (now + self.ttl_s, item[1])
+				self._items.move_to_end(session_id)
+		if expired:
+			self._count('expired')
+			self._evicted(session_id)
+		self._count('hits' if item is not None else 'misses')
+		return item[1] if item is not None else None
+
+	def put(self, session_id: str, record: Dict[str, Any]) -> None:
+		dropped = []
+		with self._lock:
+			self._items[session_id] = (time.monotonic() + self.ttl_s, record)
+			self._items.move_to_end(session_id)
+			while len(self._items) > self.max_sessions:
+				dropped.append(self._items.popitem(last=False)[0])
+		for sid in dropped:
+			self._count('evicted')
+			self._evicted(sid)
+
+	def delete(self, session_id: str) -> None:
+		with self._lock:
+			self._items.pop(session_id, None)
+
+	def sweep(self) -> int:
+		now = time.monotonic()
+		with self._lock:
+			# Entries are in access order and TTLs are uniform, so expired ones sit at the front
+			expired = []
+			for sid, (expires_at, _) in self._items.items():
+				if expires_at >= now:
+					break
+				expired.append(sid)
+			for sid in expired:
+				del self._items[sid]
+		for sid in expired:
+			self._evicted(sid)
+		self._count('expired', len(expired))
+		return len(expired)
+
+	def info(self) -> Dict[str, Any]:
+		with self._lock:
+			size = len(self._items)
+		with self._stats_lock:
+			return {"backend": "memory", "sessions": size, "ttl_seconds": self.ttl_s, **self.stats}
+
+
+class SQLiteSessionStore(_SweepingStore):
+	"""Sessions shared between worker processes through a local SQLite file (WAL mode).
+
+	Stands in for an external shared store: every get/put goes through the codec, so session
+	state is serialized compactly and any worker can continue any session.
+	"""
+
+	def __init__(self, path: str, codec: SessionCodec, ttl_s: float, sweep_s: float = 60.0, on_evict: Optional[Callable[[str], None]] = None) -> None:
+		self.path = path
+		self.codec = codec
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self._local = threading.local()
+		conn = self._conn()
+		conn.execute('PRAGMA journal_mode=WAL')
+		conn.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)')
+		conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+		conn.commit()
+		super().__init__(ttl_s, sweep_s, on_evict)
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+			conn.execute('PRAGMA synchronous=NORMAL')
+			self._local.conn = conn
+		return conn
+
+	def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+		if not session_id:
+			return None
+		conn = self._conn()
+		now = time.time()
+		with conn:
+			row = conn.execute('SELECT data FROM sessions WHERE id = ? AND expires_at >= ?', (session_id, now)).fetchone()
+			if row is not None:
+				conn.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (now + self.ttl_s, session_id))
+		if row is None:
+			self._count('misses')
+			return None
+		self._count('hits')
+		return self.codec.decode(row[0])
+
+	def put(self, session_id: str, record: Dict[str, Any]) -> None:
+		conn = self._conn()
+		with conn:
+			conn.execute(
+				'INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) '
+				'ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+				(session_id, self.codec.encode(record), time.time() + self.ttl_s),
+			)
+
+	def delete(self, session_id: str) -> None:
+		conn = self._conn()
+		with conn:
+			conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+	def sweep(self) -> int:
+		conn = self._conn()
+		now = time.time()
+		with conn:
+			expired = [r[0] for r in conn.execute('SELECT id FROM sessions WHERE expires_at < ?', (now,))]
+			conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,))
+		for sid in expired:
+			self._evicted(sid)
+		self._count('expired', len(expired))
+		return len(expired)
+
+	def info(self) -> Dict[str, Any]:
+		size = self._conn().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+		with self._stats_lock:
+			return {"backend": "sqlite", "sessions": size, "ttl_seconds": self.ttl_s, **self.stats}
+
+
+def open_session_store(codec: SessionCodec, on_evict: Optional[Callable[[str], None]] = None):
+	"""Select the session backend from the environment.
+
+	Environment variables:
+	- SESSION_BACKEND: "memory" (default, single process) or "sqlite" (shared by all workers)
+	- SESSION_TTL_SECONDS: idle time before a session expires (default: 7200)
+	- SESSION_MAX: max sessions held by the memory backend before LRU eviction (default: 10000)
+	- SESSION_SWEEP_SECONDS: background sweep interval (default: 60)
+	- SESSION_STORE_PATH: SQLite file for the shared backend (default: data/sessions.db)
+	"""
+	backend = os.getenv('SESSION_BACKEND', 'memory').lower()
+	ttl_s = float(os.getenv('SESSION_TTL_SECONDS', '7200'))
+	sweep_s = float(os.getenv('SESSION_SWEEP_SECONDS', '60'))
+	if backend == 'sqlite':
+		path = os.getenv('SESSION_STORE_PATH', os.path.join('data', 'sessions.db'))
+		return SQLiteSessionStore(path, codec, ttl_s, sweep_s, on_evict)
+	return MemorySessionStore(ttl_s, int(os.getenv('SESSION_MAX', '10000')), sweep_s, on_evict)
@@ -1,27 +1,228 @@
+import atexit
+import copy
 import json
 import os
+import sqlite3
 import threading
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
 class JSONStore:
-	def __init__(self, path: str) -> None:
+	"""Single JSON document on disk with a read-through cache and coalesced, atomic writes.
+
+	read() returns a cached snapshot without taking a lock; the snapshot is shared and must be
+	treated as read-only (write a new document instead of mutating it). The cache is invalidated
+	when the file's mtime/inode/size change underneath us. write() swaps the snapshot immediately
+	and flushes to disk (temp file + os.replace) after JSON_STORE_FLUSH_MS, so a burst of writes
+	costs one serialization. A window of 0 flushes synchronously.
+	"""
+
+	def __init__(self, path: str, flush_ms: Optional[int] = None) -> None:
 		self.path = path
+		self.flush_s = (flush_ms if flush_ms is not None else int(os.getenv('JSON_STORE_FLUSH_MS', '50'))) / 1000.0
 		self._lock = threading.Lock()
+		self._snapshot: Optional[Dict[str, Any]] = None
+		self._signature: Optional[tuple] = None
+		self._dirty = False
+		self._timer: Optional[threading.Timer] = None
 		os.makedirs(os.path.dirname(path), exist_ok=True)
 		if not os.path.exists(self.path):
 			with open(self.path, 'w', encoding='utf-8') as f:
 				f.write('{}')
+		atexit.register(self.flush)
+
+	def _stat_signature(self) -> Optional[tuple]:
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return None
+		return (st.st_mtime_ns, st.st_ino, st.st_size)
 
 	def read(self) -> Dict[str, Any]:
+		snapshot = self._snapshot
+		if snapshot is not None and (self._dirty or self._stat_signature() == self._signature):
+			return snapshot
 		with self._lock:
+			if self._dirty and self._snapshot is not None:
+				return self._snapshot
+			signature = self._stat_signature()
+			if self._snapshot is not None and signature == self._signature:
+				return self._snapshot
 			try:
 				with open(self.path, 'r', encoding='utf-8') as f:
-					return json.load(f)
+					data = json.load(f)
 			except Exception:
-				return {}
+				data = {}
+			self._snapshot = data
+			self._signature = signature
+			return data
 
 	def write(self, data: Dict[str, Any]) -> None:
 		with self._lock:
-			with open(self.path, 'w', encoding='utf-8') as f:
-				json.dump(data, f, ensure_ascii=False, indent=2) 
\ No newline at end of file
+			self._snapshot = data
+			self._dirty = True
+			if self.flush_s <= 0:
+				self._flush_locked()
+				return
+			if self._timer is None:
+				self._timer = threading.Timer(self.flush_s, self.flush)
+				self._timer.daemon = True
+				self._timer.start()
+
+	def flush(self) -> None:
+		"""Write any pending snapshot to disk now."""
+		with self._lock:
+			self._flush_locked()
+
+	def _flush_locked(self) -> None:
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		if not self._dirty or self._snapshot is None:
+			return
+		tmp = f"{self.path}.{os.getpid()}.tmp"
+		with open(tmp, 'w', encoding='utf-8') as f:
+			json.dump(self._snapshot, f, ensure_ascii=False, indent=2)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.path)
+		self._signature = self._stat_signature()
+		self._dirty = False
+
+
+class JSONUserStore:
+	"""User records kept in a single JSON document ({"users": {id: user}}) via JSONStore."""
+
+	def __init__(self, path: str) -> None:
+		self.store = JSONStore(path)
+		self._write_lock = threading.Lock()
+
+	def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+		u = self.store.read().get('users', {}).get(user_id)
+		# Callers mutate the returned record; never hand out the shared snapshot
+		return copy.deepcopy(u) if u is not None else None
+
+	def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+		for u in self.store.read().get('users', {}).values():
+			if u.get('username') == username:
+				return copy.deepcopy(u)
+		return None
+
+	def create_user(self, user: Dict[str, Any]) -> bool:
+		"""Insert a new user; returns False if the username is already taken."""
+		with self._write_lock:
+			if self.get_user_by_username(user['username']):
+				return False
+			self._save_locked(user)
+			return True
+
+	def save_user(self, user: Dict[str, Any]) -> None:
+		with self._write_lock:
+			self._save_locked(user)
+
+	def _save_locked(self, user: Dict[str, Any]) -> None:
+		# Copy-on-write: readers holding the previous snapshot keep seeing a consistent document
+		data = dict(self.store.read())
+		users = dict(data.get('users', {}))
+		users[user['id']] = copy.deepcopy(user)
+		data['users'] = users
+		self.store.write(data)
+
+	def count(self) -> int:
+		return len(self.store.read().get('users', {}))
+
+
+class SQLiteUserStore:
+	"""User records in SQLite (WAL mode): primary key on id, unique index on username.
+
+	Each user is stored as one row holding the full JSON record, so lookups and updates touch a
+	single record instead of the whole user set. Connections are per thread.
+	"""
+
+	def __init__(self, path: str) -> None:
+		self.path = path
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self._local = threading.local()
+		conn = self._conn()
+		conn.execute('PRAGMA journal_mode=WAL')
+		conn.execute(
+			'CREATE TABLE IF NOT EXISTS users ('
+			' id TEXT PRIMARY KEY,'
+			' username TEXT NOT NULL UNIQUE,'
+			' doc TEXT NOT NULL)'
+		)
+		conn.commit()
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+			conn.execute('PRAGMA synchronous=NORMAL')
+			self._local.conn = conn
+		return conn
+
+	def _one(self, sql: str, arg: str) -> Optional[Dict[str, Any]]:
+		row = self._conn().execute(sql, (arg,)).fetchone()
+		return json.loads(row[0]) if row else None
+
+	def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+		return self._one('SELECT doc FROM users WHERE id = ?', user_id)
+
+	def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+		return self._one('SELECT doc FROM users WHERE username = ?', username)
+
+	def create_user(self, user: Dict[str, Any]) -> bool:
+		"""Insert a new user; returns False if the username (or id) is already taken."""
+		conn = self._conn()
+		try:
+			with conn:
+				conn.execute(
+					'INSERT INTO users (id, username, doc) VALUES (?, ?, ?)',
+					(user['id'], user['username'], json.dumps(user, ensure_ascii=False)),
+				)
+			return True
+		except sqlite3.IntegrityError:
+			return False
+
+	def save_user(self, user: Dict[str, Any]) -> None:
+		conn = self._conn()
+		with conn:
+			conn.execute(
+				'INSERT INTO users (id, username, doc) VALUES (?, ?, ?) '
+				'ON CONFLICT(id) DO UPDATE SET username = excluded.username, doc = excluded.doc',
+				(user['id'], user['username'], json.dumps(user, ensure_ascii=False)),
+			)
+
+	def count(self) -> int:
+		return self._conn().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+	def import_json(self, json_path: str) -> int:
+		"""One-shot migration from a JSONStore users document; existing ids are left untouched."""
+		if not os.path.exists(json_path):
+			return 0
+		try:
+			with open(json_path, 'r', encoding='utf-8') as f:
+				users = (json.load(f) or {}).get('users', {})
+		except Exception:
+			return 0
+		rows = [(u['id'], u['username'], json.dumps(u, ensure_ascii=False)) for u in users.values() if u.get('id') and u.get('username')]
+		conn = self._conn()
+		with conn:
+			before = conn.total_changes
+			conn.executemany('INSERT OR IGNORE INTO users (id, username, doc) VALUES (?, ?, ?)', rows)
+			return conn.total_changes - before
+
+
+def open_user_store(data_dir: str = 'data'):
+	"""Select the user-store backend from USER_STORE_BACKEND ("sqlite" by default, or "json").
+
+	On first start of the SQLite backend, users from data/users.json are migrated in.
+	"""
+	backend = os.getenv('USER_STORE_BACKEND', 'sqlite').lower()
+	json_path = os.path.join(data_dir, 'users.json')
+	if backend == 'json':
+		return JSONUserStore(json_path)
+	store = SQLiteUserStore(os.getenv('USER_STORE_PATH', os.path.join(data_dir, 'users.db')))
+	if store.count() == 0:
+		store.import_json(json_path)
+	return store
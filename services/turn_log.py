@@ -0,0 +1,33 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TurnLog:
+	"""Append-only JSONL of scored turns: the input format of scripts/rescore.py.
+
+	One line per scored answer: {"session_id", "user_id", "ts", "question_id", "user_text",
+	"points", "max_points", "context"}; context holds what dynamic questions were scored against
+	(the registration words, or the (a, b, answer) of a math question).
+	"""
+
+	def __init__(self, path: str) -> None:
+		self.path = path
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self._lock = threading.Lock()
+		self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+	def append(self, session_id: str, user_id: Optional[str], user_text: str, scored: Dict[str, Any]) -> None:
+		line = json.dumps({"session_id": session_id, "user_id": user_id, "ts": round(time.time(), 3), "user_text": user_text, **scored}, ensure_ascii=False)
+		with self._lock:
+			self._file.write(line + '\n')
+
+
+def open_turn_log() -> Optional[TurnLog]:
+	"""TURN_LOG_PATH enables transcript logging (off by default: answers are patient data)."""
+	path = os.getenv('TURN_LOG_PATH')
+	return TurnLog(path) if path else None
@@ -1,26 +1,266 @@
+import asyncio
+import hashlib
 import os
+import random
+import threading
+import time
 import requests
-from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from services.audio_codec import DEFAULT_SR, wav_from_pcm
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+	import httpx  # type: ignore
+	_HTTPX = True
+except Exception:
+	_HTTPX = False
 
 
 class XTTSNotConfiguredError(Exception):
 	pass
 
 
+class XTTSUnavailableError(XTTSNotConfiguredError):
+	"""Every XTTS backend is failing (circuit breakers open); callers should answer 503."""
+
+	def __init__(self, message: str, retry_after: float = 0.0) -> None:
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+# Statuses worth retrying for idempotent requests (429 honours Retry-After and does not trip the breaker)
+_RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class _CircuitBreaker:
+	"""Opens after `threshold` consecutive failures; after `cooldown_s` a single probe is let through."""
+
+	def __init__(self, threshold: int, cooldown_s: float) -> None:
+		self.threshold = max(1, threshold)
+		self.cooldown_s = cooldown_s
+		self._lock = threading.Lock()
+		self._failures = 0
+		self._opened_at: Optional[float] = None
+		self._probing = False
+		self.trips = 0
+
+	def available(self) -> bool:
+		"""Whether allow() would currently succeed (read-only)."""
+		with self._lock:
+			return self._opened_at is None or (not self._probing and time.monotonic() >= self._opened_at + self.cooldown_s)
+
+	def allow(self) -> bool:
+		with self._lock:
+			if self._opened_at is None:
+				return True
+			if self._probing or time.monotonic() < self._opened_at + self.cooldown_s:
+				return False
+			self._probing = True
+			return True
+
+	def abandon(self) -> None:
+		"""A request let through by allow() ended without an outcome; free the probe slot if it held it."""
+		with self._lock:
+			self._probing = False
+
+	def retry_in(self) -> float:
+		with self._lock:
+			if self._opened_at is None:
+				return 0.0
+			return max(self._opened_at + self.cooldown_s - time.monotonic(), 1.0)
+
+	def success(self) -> None:
+		with self._lock:
+			self._failures = 0
+			self._opened_at = None
+			self._probing = False
+
+	def failure(self) -> None:
+		with self._lock:
+			self._failures += 1
+			if self._probing or self._failures >= self.threshold:
+				if self._opened_at is None or self._probing:
+					self.trips += 1
+				self._opened_at = time.monotonic()
+				self._probing = False
+
+	def state(self) -> str:
+		with self._lock:
+			if self._opened_at is None:
+				return 'closed'
+			return 'half-open' if self._probing or time.monotonic() >= self._opened_at + self.cooldown_s else 'open'
+
+	def info(self) -> Dict[str, Any]:
+		return {"state": self.state(), "consecutive_failures": self._failures, "trips": self.trips}
+
+
+class _Backend:
+	"""One xtts_server instance: its breaker, in-flight count and last active health check."""
+
+	__slots__ = ('url', 'breaker', 'inflight', 'requests', 'healthy', 'checked_at')
+
+	def __init__(self, url: str, breaker: _CircuitBreaker) -> None:
+		self.url = url
+		self.breaker = breaker
+		self.inflight = 0
+		self.requests = 0
+		self.healthy = True
+		self.checked_at: Optional[float] = None
+
+	def info(self) -> Dict[str, Any]:
+		return {
+			"url": self.url,
+			"healthy": self.healthy,
+			"inflight": self.inflight,
+			"requests": self.requests,
+			"breaker": self.breaker.info(),
+		}
+
+
+class _StreamBody:
+	"""Iterator over a streamed response that frees its backend slot once, on exhaustion, close or collection."""
+
+	def __init__(self, resp: requests.Response, release: Any, chunk_size: int) -> None:
+		self._resp = resp
+		self._release = release
+		self._chunks = resp.iter_content(chunk_size=chunk_size)
+		self._closed = False
+
+	def __iter__(self) -> 'Iterator[bytes]':
+		return self
+
+	def __next__(self) -> bytes:
+		try:
+			while True:
+				chunk = next(self._chunks)
+				if chunk:
+					return chunk
+		except BaseException:
+			self.close()
+			raise
+
+	def close(self) -> None:
+		if not self._closed:
+			self._closed = True
+			self._resp.close()
+			self._release()
+
+	def __del__(self) -> None:
+		self.close()
+
+
+class _AsyncStreamBody:
+	"""Async iterator over a streamed httpx response that frees its backend slot once, on exhaustion or aclose()."""
+
+	def __init__(self, resp: 'httpx.Response', release: Any, chunk_size: int) -> None:
+		self._resp = resp
+		self._release = release
+		self._chunks = resp.aiter_bytes(chunk_size)
+		self._closed = False
+
+	def __aiter__(self) -> 'AsyncIterator[bytes]':
+		return self
+
+	async def __anext__(self) -> bytes:
+		try:
+			while True:
+				chunk = await self._chunks.__anext__()
+				if chunk:
+					return chunk
+		except BaseException:
+			await self.aclose()
+			raise
+
+	async def aclose(self) -> None:
+		if not self._closed:
+			self._closed = True
+			# Release first: a cancellation while closing the connection must not leak the slot
+			self._release()
+			await self._resp.aclose()
+
+
+def _affinity(voice_id: str, url: str) -> int:
+	# Rendezvous hashing: each voice has a stable backend preference order that only shifts for removed nodes
+	return int.from_bytes(hashlib.blake2b(f"{voice_id}\x1f{url}".encode('utf-8'), digest_size=8).digest(), 'big')
+
+
 class XTTSService:
-	"""Wrapper around a self-hosted XTTS v2 (or equivalent) HTTP service.
+	"""Wrapper around one or more self-hosted XTTS v2 (or equivalent) HTTP services.
+
+	Requests share one keep-alive connection pool. Idempotent calls (synthesis) are retried on
+	connection errors, timeouts and 429/5xx with jittered exponential backoff; voice cloning is only
+	retried when the connection could not be established. Each backend has a circuit breaker, and
+	callers fail fast with XTTSUnavailableError (a 503) once every backend is down.
+
+	With several backends, each request goes to the one with the fewest in-flight requests, with
+	voice affinity: a voice prefers its rendezvous-hashed backend (keeping its conditioning latents
+	hot there) unless that backend is more than XTTS_AFFINITY_SLACK requests busier than the least
+	loaded one. Voices live on the backend that cloned them; where a voice is held is learned from
+	clone/synthesis responses, and a 404 for an unknown voice moves on to the next backend. Backends
+	are health-checked in the background and unhealthy ones skipped. Optionally, a non-streaming
+	synthesis still running after XTTS_HEDGE_MS is hedged to a second backend holding the voice.
+
+	aclone_voice(), asynthesize_speech() and astream_speech() are non-blocking equivalents for the
+	async app (app_async.py). They go through an httpx.AsyncClient with the same routing, retries,
+	breakers and in-flight accounting, so a slow synthesis holds a connection but no thread.
 
 	Environment variables:
-	- XTTS_BASE_URL: Base URL of the self-hosted XTTS service
+	- XTTS_BASE_URL: Base URL of the self-hosted XTTS service (comma-separated for several)
 		Expected endpoints:
 			POST {XTTS_BASE_URL}/clone -> form-data: audio(file)
 			  Response: {"voice_id": str}
-			POST {XTTS_BASE_URL}/tts -> json: {"text": str, "voice_id": str}
-			  Response: audio/wav bytes
+			POST {XTTS_BASE_URL}/tts -> json: {"text": str, "voice_id": str, "format": "pcm"}
+			  Response: audio/L16 PCM (or audio/wav) bytes (404 if the voice is not on this backend)
+			POST {XTTS_BASE_URL}/tts/stream -> json: {"text": str, "voice_id": str}
+			  Response: chunked audio/wav (streaming header, then PCM16 per sentence)
+			GET {XTTS_BASE_URL}/health
+	- XTTS_POOL_SIZE: pooled keep-alive connections per backend (default: 16)
+	- XTTS_CONNECT_TIMEOUT: seconds to establish a connection (default: 3)
+	- XTTS_READ_TIMEOUT: seconds to wait for response bytes (default: 60)
+	- XTTS_POOL_TIMEOUT: seconds the async client waits for a free pooled connection (default: 30)
+	- XTTS_RETRIES: retries after the first attempt (default: 2)
+	- XTTS_RETRY_BACKOFF_MS: base backoff, doubled per retry with full jitter (default: 200)
+	- XTTS_RETRY_AFTER_MAX_MS: cap on waits requested by a Retry-After header (default: 2000)
+	- XTTS_BREAKER_FAILURES: consecutive failures that open a backend's breaker (default: 5)
+	- XTTS_BREAKER_COOLDOWN: seconds before a probe request is allowed (default: 30)
+	- XTTS_HEALTH_INTERVAL: seconds between active health checks, 0 disables (default: 10)
+	- XTTS_AFFINITY_SLACK: extra in-flight requests tolerated on a voice's preferred backend (default: 2)
+	- XTTS_HEDGE_MS: hedge non-streaming synthesis after this delay, 0 disables (default: 0)
 	"""
 
 	def __init__(self) -> None:
-		self.base_url: Optional[str] = os.getenv('XTTS_BASE_URL')
+		urls = [u.strip().rstrip('/') for u in (os.getenv('XTTS_BASE_URL') or '').split(',') if u.strip()]
+		self.base_url: Optional[str] = urls[0] if urls else None
+		pool_size = max(1, int(os.getenv('XTTS_POOL_SIZE', '16')))
+		self.timeout = (float(os.getenv('XTTS_CONNECT_TIMEOUT', '3')), float(os.getenv('XTTS_READ_TIMEOUT', '60')))
+		self.pool_timeout = float(os.getenv('XTTS_POOL_TIMEOUT', '30'))
+		self.retries = max(0, int(os.getenv('XTTS_RETRIES', '2')))
+		self.backoff_s = float(os.getenv('XTTS_RETRY_BACKOFF_MS', '200')) / 1000.0
+		# Sync retries sleep in the request thread, so a server asking for a long pause must not pin it
+		self.retry_after_max_s = float(os.getenv('XTTS_RETRY_AFTER_MAX_MS', '2000')) / 1000.0
+		self.affinity_slack = max(0, int(os.getenv('XTTS_AFFINITY_SLACK', '2')))
+		self.hedge_s = float(os.getenv('XTTS_HEDGE_MS', '0')) / 1000.0
+		threshold = int(os.getenv('XTTS_BREAKER_FAILURES', '5'))
+		cooldown = float(os.getenv('XTTS_BREAKER_COOLDOWN', '30'))
+		self.backends: List[_Backend] = [_Backend(u, _CircuitBreaker(threshold, cooldown)) for u in urls]
+		self.pool_size = pool_size
+		self._aclient: Optional['httpx.AsyncClient'] = None
+		self._session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=max(1, len(urls)), pool_maxsize=pool_size, max_retries=0)
+		self._session.mount('http://', adapter)
+		self._session.mount('https://', adapter)
+		self._lock = threading.Lock()
+		# voice_id -> urls of backends known to hold it
+		self._holders: Dict[str, Set[str]] = {}
+		self.hedges = 0
+		self.hedge_wins = 0
+		self._hedge_pool: Optional[ThreadPoolExecutor] = None
+		if self.hedge_s > 0 and len(self.backends) > 1:
+			self._hedge_pool = ThreadPoolExecutor(max_workers=2 * pool_size, thread_name_prefix='xtts-hedge')
+		interval = float(os.getenv('XTTS_HEALTH_INTERVAL', '10'))
+		if interval > 0 and len(self.backends) > 1:
+			threading.Thread(target=self._health_loop, args=(interval,), name='xtts-health', daemon=True).start()
 
 	def is_configured(self) -> bool:
 		return bool(self.base_url)
@@ -29,23 +269,396 @@ class XTTSService:
 		if not self.base_url:
 			raise XTTSNotConfiguredError("XTTS_BASE_URL not set. Configure self-hosted XTTS service.")
 
-	def clone_voice(self, audio_path: str) -> str:
+	def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+		if retry_after:
+			try:
+				return min(max(float(retry_after), 0.0), self.retry_after_max_s)
+			except ValueError:
+				pass
+		return random.uniform(0, self.backoff_s * (2 ** attempt))
+
+	def _health_loop(self, interval: float) -> None:
+		while True:
+			for backend in self.backends:
+				try:
+					resp = self._session.get(f"{backend.url}/health", timeout=self.timeout[0])
+					healthy = resp.status_code == 200
+					resp.close()
+				except requests.RequestException:
+					healthy = False
+				backend.healthy = healthy
+				backend.checked_at = time.time()
+			time.sleep(interval)
+
+	def _remember(self, voice_id: Optional[str], url: str, present: bool) -> None:
+		if not voice_id:
+			return
+		with self._lock:
+			holders = self._holders.setdefault(voice_id, set())
+			if present:
+				holders.add(url)
+			else:
+				holders.discard(url)
+				if not holders:
+					del self._holders[voice_id]
+
+	def _pick(self, voice_id: Optional[str], missing: Set[str], failed: Set[str]) -> _Backend:
+		"""Choose and reserve a backend: known holders of the voice first, then least loaded within affinity slack.
+
+		Backends in `missing` lack the voice and are never chosen; `failed` ones are avoided while
+		alternatives exist.
+		"""
+		with self._lock:
+			holders = self._holders.get(voice_id, set()) if voice_id else set()
+			pool = [b for b in self.backends if b.url not in missing]
+			tiers = [
+				[b for b in pool if b.url not in failed and b.healthy],
+				[b for b in pool if b.url not in failed],
+				pool,
+			]
+			for cands in tiers:
+				cands = [b for b in cands if b.breaker.available()]
+				if not cands:
+					continue
+				held = [b for b in cands if b.url in holders]
+				if held:
+					cands = held
+				if voice_id:
+					cands.sort(key=lambda b: _affinity(voice_id, b.url), reverse=True)
+				least = min(b.inflight for b in cands)
+				for backend in cands:
+					if backend.inflight <= least + self.affinity_slack and backend.breaker.allow():
+						backend.inflight += 1
+						backend.requests += 1
+						return backend
+			if not pool:
+				raise RuntimeError(f"voice {voice_id} not found on any XTTS backend")
+			retry_after = min(b.breaker.retry_in() for b in pool)
+		raise XTTSUnavailableError("XTTS backend unavailable (circuit open)", retry_after=retry_after)
+
+	def _release(self, backend: _Backend) -> None:
+		with self._lock:
+			backend.inflight -= 1
+
+	def _judge(self, backend: _Backend, status: int, voice_id: Optional[str], idempotent: bool, attempt: int, missing: Set[str], failed: Set[str]) -> str:
+		"""Record a response against the backend and decide: 'next' backend, 'retry' after backoff, or 'done'."""
+		if status >= 500:
+			backend.breaker.failure()
+		else:
+			backend.breaker.success()
+		if status == 404 and voice_id:
+			# The voice lives on another backend; trying elsewhere does not count as a retry
+			self._remember(voice_id, backend.url, False)
+			missing.add(backend.url)
+			if len(missing) < len(self.backends):
+				return 'next'
+		if idempotent and status in _RETRY_STATUSES and attempt < self.retries:
+			failed.add(backend.url)
+			return 'retry'
+		return 'done'
+
+	def _post(self, path: str, idempotent: bool, voice_id: Optional[str] = None, avoid: Optional[Set[str]] = None, chosen: Optional[List[str]] = None, **kwargs: Any) -> Tuple[_Backend, requests.Response]:
+		"""POST with routing, retries and circuit breaking; returns the backend and a 2xx response.
+
+		For stream=True the backend stays reserved until the caller calls _release(backend).
+		"""
 		self._require_configured()
+		stream = bool(kwargs.get('stream'))
+		missing: Set[str] = set()
+		failed: Set[str] = set(avoid or ())
+		attempt = 0
+		while True:
+			backend = self._pick(voice_id, missing, failed)
+			if chosen is not None:
+				chosen.append(backend.url)
+			keep = False
+			# Every attempt must report to the breaker, or a half-open probe would hold it shut forever
+			settled = False
+			try:
+				try:
+					resp = self._session.post(f"{backend.url}{path}", timeout=self.timeout, **kwargs)
+				except requests.ConnectionError as e:
+					# Connect failures never reached the server, so even non-idempotent calls may retry
+					backend.breaker.failure()
+					settled = True
+					failed.add(backend.url)
+					if attempt >= self.retries or not (idempotent or isinstance(e, requests.ConnectTimeout) or _not_sent(e)):
+						raise
+					time.sleep(self._backoff(attempt))
+					attempt += 1
+					continue
+				except requests.Timeout:
+					backend.breaker.failure()
+					settled = True
+					failed.add(backend.url)
+					if not idempotent or attempt >= self.retries:
+						raise
+					time.sleep(self._backoff(attempt))
+					attempt += 1
+					continue
+				except requests.RequestException:
+					# Protocol errors (bad chunking, redirect loops, ...) count against the backend
+					backend.breaker.failure()
+					settled = True
+					raise
+				verdict = self._judge(backend, resp.status_code, voice_id, idempotent, attempt, missing, failed)
+				settled = True
+				if verdict == 'next':
+					resp.close()
+					continue
+				if verdict == 'retry':
+					delay = self._backoff(attempt, resp.headers.get('Retry-After'))
+					resp.close()
+					time.sleep(delay)
+					attempt += 1
+					continue
+				try:
+					resp.raise_for_status()
+				except Exception:
+					resp.close()
+					raise
+				self._remember(voice_id, backend.url, True)
+				keep = stream
+				return backend, resp
+			finally:
+				if not settled:
+					backend.breaker.abandon()
+				if not keep:
+					self._release(backend)
+
+	def clone_voice(self, audio_path: str) -> str:
+		# Read up front so a connect-phase retry re-sends the full body
 		with open(audio_path, 'rb') as f:
-			resp = requests.post(f"{self.base_url}/clone", files={'audio': f}, timeout=120)
-			resp.raise_for_status()
-			data = resp.json()
-			voice_id = data.get('voice_id')
-			if not voice_id:
-				raise RuntimeError('XTTS clone did not return voice_id')
-			return voice_id
+			audio = f.read()
+		backend, resp = self._post("/clone", idempotent=False, files={'audio': (os.path.basename(audio_path), audio)})
+		data = resp.json()
+		voice_id = data.get('voice_id')
+		if not voice_id:
+			raise RuntimeError('XTTS clone did not return voice_id')
+		self._remember(voice_id, backend.url, True)
+		return voice_id
 
 	def synthesize_speech(self, text: str, voice_id: str) -> bytes:
+		"""Synthesize text as a PCM16 WAV.
+
+		Audio crosses the XTTS hop as raw PCM and only gets a WAV header here, so neither side
+		re-encodes it; backends that ignore the format field answer with WAV, which is passed through.
+		"""
+		if self._hedge_pool is None:
+			resp = self._post("/tts", idempotent=True, voice_id=voice_id, json={"text": text, "voice_id": voice_id, "format": "pcm"})[1]
+		else:
+			resp = self._hedged_synthesis(text, voice_id)
+		return _as_wav(resp)
+
+	def _hedged_synthesis(self, text: str, voice_id: str) -> requests.Response:
+		"""Send the request, and a second one to another backend if the first is slower than hedge_s.
+
+		The slower request cannot be cancelled mid-flight; its result is discarded.
+		"""
+		payload = {"text": text, "voice_id": voice_id, "format": "pcm"}
+		chosen: List[str] = []
+		primary = self._hedge_pool.submit(self._post, "/tts", True, voice_id, None, chosen, json=payload)
+		done, _ = wait([primary], timeout=self.hedge_s)
+		if done:
+			return primary.result()[1]
+		if not self._can_hedge(voice_id, chosen):
+			return primary.result()[1]
+		with self._lock:
+			self.hedges += 1
+		hedge = self._hedge_pool.submit(self._post, "/tts", True, voice_id, set(chosen), None, json=payload)
+		pending = {primary, hedge}
+		error: Optional[BaseException] = None
+		while pending:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				if future.exception() is not None:
+					error = error or future.exception()
+					continue
+				if future is hedge:
+					with self._lock:
+						self.hedge_wins += 1
+				return future.result()[1]
+		raise error  # type: ignore[misc]
+
+	def _can_hedge(self, voice_id: str, chosen: List[str]) -> bool:
+		"""Whether another available backend (holding the voice, if known) could take a hedge."""
+		with self._lock:
+			holders = self._holders.get(voice_id)
+			return any(b.url not in chosen and b.breaker.available() and (not holders or b.url in holders) for b in self.backends)
+
+	def stream_speech(self, text: str, voice_id: str, chunk_size: int = 8192) -> Iterator[bytes]:
+		"""Open a streaming synthesis request and return an iterator over audio chunks.
+
+		The upstream request is issued eagerly so connection/HTTP errors surface to the caller
+		before any bytes are relayed (and are retried like synthesize_speech up to that point).
+		Streams are not hedged.
+		"""
+		backend, resp = self._post("/tts/stream", idempotent=True, voice_id=voice_id, json={"text": text, "voice_id": voice_id}, stream=True)
+		return _StreamBody(resp, lambda: self._release(backend), chunk_size)
+
+	def _async_client(self) -> 'httpx.AsyncClient':
+		if not _HTTPX:
+			raise RuntimeError('the async XTTS client requires httpx (pip install httpx)')
+		if self._aclient is None:
+			connections = self.pool_size * max(1, len(self.backends))
+			self._aclient = httpx.AsyncClient(
+				# Requests beyond the connection limit wait for a free connection, but not forever
+				timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0], pool=self.pool_timeout),
+				limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+			)
+		return self._aclient
+
+	async def _apost(self, path: str, idempotent: bool, voice_id: Optional[str] = None, avoid: Optional[Set[str]] = None, chosen: Optional[List[str]] = None, stream: bool = False, **kwargs: Any) -> Tuple[_Backend, 'httpx.Response']:
+		"""Async _post: same routing, retries and circuit breaking; returns the backend and a 2xx response.
+
+		For stream=True the body is not read and the backend stays reserved until the caller calls
+		_release(backend).
+		"""
 		self._require_configured()
-		resp = requests.post(
-			f"{self.base_url}/tts",
-			json={"text": text, "voice_id": voice_id},
-			timeout=120
-		)
-		resp.raise_for_status()
-		return resp.content 
\ No newline at end of file
+		client = self._async_client()
+		missing: Set[str] = set()
+		failed: Set[str] = set(avoid or ())
+		attempt = 0
+		while True:
+			backend = self._pick(voice_id, missing, failed)
+			if chosen is not None:
+				chosen.append(backend.url)
+			keep = False
+			# As in _post: a cancelled (client gone) or otherwise unjudged attempt must free a half-open probe
+			settled = False
+			try:
+				try:
+					resp = await client.send(client.build_request('POST', f"{backend.url}{path}", **kwargs), stream=stream)
+				except httpx.PoolTimeout:
+					# Our own pool is exhausted; the backend is not at fault, so the breaker is left alone
+					raise
+				except (httpx.ConnectError, httpx.ConnectTimeout):
+					# Connect failures never reached the server, so even non-idempotent calls may retry
+					backend.breaker.failure()
+					settled = True
+					failed.add(backend.url)
+					if attempt >= self.retries:
+						raise
+					await asyncio.sleep(self._backoff(attempt))
+					attempt += 1
+					continue
+				except httpx.TransportError:
+					# Read timeouts and dropped connections
+					backend.breaker.failure()
+					settled = True
+					failed.add(backend.url)
+					if not idempotent or attempt >= self.retries:
+						raise
+					await asyncio.sleep(self._backoff(attempt))
+					attempt += 1
+					continue
+				except httpx.HTTPError:
+					# Protocol errors such as too many redirects or undecodable bodies
+					backend.breaker.failure()
+					settled = True
+					raise
+				verdict = self._judge(backend, resp.status_code, voice_id, idempotent, attempt, missing, failed)
+				settled = True
+				if verdict == 'next':
+					await resp.aclose()
+					continue
+				if verdict == 'retry':
+					delay = self._backoff(attempt, resp.headers.get('Retry-After'))
+					await resp.aclose()
+					await asyncio.sleep(delay)
+					attempt += 1
+					continue
+				if resp.is_error:
+					await resp.aclose()
+					resp.raise_for_status()
+				self._remember(voice_id, backend.url, True)
+				keep = stream
+				return backend, resp
+			finally:
+				if not settled:
+					backend.breaker.abandon()
+				if not keep:
+					self._release(backend)
+
+	async def aclone_voice(self, audio: bytes, filename: str = 'voice.wav') -> str:
+		"""clone_voice() from bytes already in memory (uploads need not touch disk)."""
+		backend, resp = await self._apost("/clone", idempotent=False, files={'audio': (filename, audio)})
+		voice_id = resp.json().get('voice_id')
+		if not voice_id:
+			raise RuntimeError('XTTS clone did not return voice_id')
+		self._remember(voice_id, backend.url, True)
+		return voice_id
+
+	async def asynthesize_speech(self, text: str, voice_id: str) -> bytes:
+		payload = {"text": text, "voice_id": voice_id, "format": "pcm"}
+		if self.hedge_s <= 0 or len(self.backends) < 2:
+			resp = (await self._apost("/tts", idempotent=True, voice_id=voice_id, json=payload))[1]
+		else:
+			resp = await self._ahedged_synthesis(payload, voice_id)
+		return _as_wav(resp)
+
+	async def _ahedged_synthesis(self, payload: Dict[str, Any], voice_id: str) -> 'httpx.Response':
+		"""Like _hedged_synthesis, except that the losing request is cancelled."""
+		chosen: List[str] = []
+		primary = asyncio.ensure_future(self._apost("/tts", True, voice_id, None, chosen, json=payload))
+		tasks = [primary]
+		try:
+			done, _ = await asyncio.wait(tasks, timeout=self.hedge_s)
+			if done or not self._can_hedge(voice_id, chosen):
+				return (await primary)[1]
+			with self._lock:
+				self.hedges += 1
+			hedge = asyncio.ensure_future(self._apost("/tts", True, voice_id, set(chosen), None, json=payload))
+			tasks.append(hedge)
+			pending = set(tasks)
+			error: Optional[BaseException] = None
+			while pending:
+				done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+				for task in done:
+					if task.exception() is not None:
+						error = error or task.exception()
+						continue
+					if task is hedge:
+						with self._lock:
+							self.hedge_wins += 1
+					return task.result()[1]
+			raise error  # type: ignore[misc]
+		finally:
+			for task in tasks:
+				if not task.done():
+					task.cancel()
+
+	async def astream_speech(self, text: str, voice_id: str, chunk_size: int = 8192) -> _AsyncStreamBody:
+		"""stream_speech() for the async app; the caller must aclose() the body if it stops early."""
+		backend, resp = await self._apost("/tts/stream", idempotent=True, voice_id=voice_id, json={"text": text, "voice_id": voice_id}, stream=True)
+		return _AsyncStreamBody(resp, lambda: self._release(backend), chunk_size)
+
+	async def aclose(self) -> None:
+		if self._aclient is not None:
+			await self._aclient.aclose()
+			self._aclient = None
+
+	def info(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"base_url": self.base_url,
+				"backends": [b.info() for b in self.backends],
+				"known_voices": len(self._holders),
+				"hedges": self.hedges,
+				"hedge_wins": self.hedge_wins,
+			}
+
+
+def _as_wav(resp: Any) -> bytes:
+	# requests.Response or httpx.Response; both expose headers and content
+	content_type = resp.headers.get('Content-Type', '')
+	if not content_type.lower().startswith('audio/l16'):
+		return resp.content
+	params = dict(p.strip().partition('=')[::2] for p in content_type.split(';')[1:])
+	return wav_from_pcm(resp.content, int(params.get('rate') or DEFAULT_SR))
+
+
+def _not_sent(e: requests.ConnectionError) -> bool:
+	# urllib3 wraps connect-phase failures (refused, DNS) in NewConnectionError
+	reason = getattr(e.args[0], 'reason', None) if e.args else None
+	return type(reason).__name__ in ('NewConnectionError', 'NameResolutionError')
@@ -0,0 +1,55 @@
+import pytest
+
+from data.matchers import Answer, KeywordCountMatcher, KeywordMatcher
+from data.questions import load_questions
+
+QUESTIONS = {q.id: q for q in load_questions()}
+
+
+@pytest.mark.parametrize('question_id, text, points', [
+	# Inflections allowed by the question's params
+	('memory_recent_event', 'there were elections last week', 1),
+	('memory_recent_event', 'a cricket match on TV', 1),
+	('memory_recent_event', 'two matches on TV', 1),
+	('memory_recent_event', 'nothing much', 0),
+	('orientation_day', "it's Monday", 1),
+	('orientation_season', 'rainy season', 1),
+	('planning_cook_dinner', 'first buying pasta, then boiling water, cutting onions, cooking and serving it', 3),
+	('planning_cook_dinner', 'cook it', 1),
+	# Keywords that only start a longer word
+	('orientation_month', "I don't know, maybe", 0),
+	('orientation_day', 'on Sundays', 0),
+	('planning_cook_dinner', 'address the cute cookie', 0),
+	('attention_count_backward_hint', '1990', 0),
+	('attention_count_backward_hint', '20, 19', 1),
+])
+def test_question_keywords(question_id, text, points):
+	assert QUESTIONS[question_id].score(Answer(text)) == points
+
+
+def test_planning_keywords_count_inflections():
+	matcher = KeywordCountMatcher(['STORE', 'BUY', 'PREP', 'CUT', 'BOIL', 'ADD', 'COOK', 'DRAIN', 'SERVE'], 9, ['S', 'ES', 'ED', 'ING'])
+	# BUY, BOIL, CUT (doubled T), COOK and SERVE (dropped E); BUY counts once
+	assert matcher.score(Answer('first buying pasta, then boiling water, cutting onions, cooking and serving it, then buy more')) == 5
+	assert matcher.score(Answer('prepped, stored and drained')) == 3
+
+
+def test_keywords_match_whole_tokens_only():
+	matcher = KeywordMatcher(['ADD'], 1)
+	assert matcher.score(Answer('add the salt')) == 1
+	assert matcher.score(Answer('adding salt')) == 0
+	assert matcher.score(Answer('a madder colour')) == 0
+	assert KeywordMatcher(['ADD'], 1, ['ING']).score(Answer('adding salt')) == 1
+
+
+def test_mixed_keyword_matches_joined_or_spaced():
+	matcher = KeywordMatcher(['3PM'], 1)
+	assert matcher.score(Answer('at 3PM')) == 1
+	assert matcher.score(Answer('at 3 pm')) == 1
+	assert matcher.score(Answer('at 13PM')) == 0
+
+
+def test_phrase_keywords_need_a_separator():
+	matcher = KeywordCountMatcher(['ICE CREAM', 'TEA'], 2)
+	assert matcher.score(Answer('ice-cream and tea')) == 2
+	assert matcher.score(Answer('icecream')) == 0
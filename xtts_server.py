@@ -1,18 +1,28 @@
 
 import os
-import io
+import re
+import time
+import queue
+import asyncio
 import uuid
-from typing import Dict
+import threading
+import contextlib
+import functools
+import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, Tuple, Any, Iterator, List, Optional
 
 import numpy as np
 import soundfile as sf
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import Response, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import traceback
 
-# Coqui TTS
-from TTS.api import TTS
+from services.audio_codec import DEFAULT_SR, encode as encode_audio, mime_type as audio_mime_type, negotiate_format, streaming_wav_header, wav_from_pcm
+from services.metrics import Histogram, Metrics, TimingMiddleware, current_timer, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Optional torchaudio for decoding/conversion
 try:
@@ -22,65 +32,232 @@ try:
 except Exception:
 	_TORCHAUDIO = False
 
-app = FastAPI(title="XTTS v2 Self-Hosted Server", version="0.1.0")
 
-# Initialize model (first run will download from Hugging Face)
-# Allowlist XTTS config classes for PyTorch 2.6+ safe loading
-try:
-	from torch.serialization import add_safe_globals  # type: ignore
-	# Core XTTS config classes
+@contextlib.asynccontextmanager
+async def _lifespan(app: FastAPI):
+	threading.Thread(target=_load_model, name="xtts-loader", daemon=True).start()
+	yield
+
+
+app = FastAPI(title="XTTS v2 Self-Hosted Server", version="0.1.0", lifespan=_lifespan)
+# Per-stage timers: Prometheus histograms on /metrics and a Server-Timing header per response
+metrics = Metrics("xtts")
+app.add_middleware(TimingMiddleware, metrics=metrics)
+
+# The model loads in a background thread so the HTTP server (and /health) is up immediately.
+# Startup goes loading -> warming -> ready (or failed); each phase is timed for /health.
+XTTS_MODEL_NAME = os.getenv("XTTS_MODEL_NAME", "tts_models/multilingual/multi-dataset/xtts_v2")
+tts: Any = None
+_PROCESS_STARTED = time.perf_counter()
+_startup: Dict[str, Any] = {"state": "loading", "phases": {}, "error": None}
+_startup_lock = threading.Lock()
+
+
+def _startup_phase(name: str, started: float) -> None:
+	with _startup_lock:
+		_startup["phases"][name] = round(time.perf_counter() - started, 3)
+
+
+def _allow_xtts_globals() -> None:
+	"""Allowlist XTTS config classes for PyTorch 2.6+ safe loading, then force weights_only=False."""
 	try:
-		from TTS.tts.configs.xtts_config import XttsConfig  # type: ignore
-		add_safe_globals([XttsConfig])
+		from torch.serialization import add_safe_globals  # type: ignore
+		# Core XTTS config classes
+		try:
+			from TTS.tts.configs.xtts_config import XttsConfig  # type: ignore
+			add_safe_globals([XttsConfig])
+		except Exception:
+			pass
+		try:
+			from TTS.tts.models.xtts import XttsAudioConfig  # type: ignore
+			add_safe_globals([XttsAudioConfig])
+		except Exception:
+			pass
+		# Shared configs (module path differs by version); import what exists
+		for modpath, attr in [
+			("TTS.config.shared_configs", "BaseDatasetConfig"),
+			("TTS.tts.configs.shared_configs", "BaseDatasetConfig"),
+			("TTS.config.shared_configs", "BaseAudioConfig"),
+			("TTS.tts.configs.shared_configs", "BaseAudioConfig"),
+			("TTS.config.shared_configs", "CharactersConfig"),
+			("TTS.tts.configs.shared_configs", "CharactersConfig"),
+		]:
+			try:
+				module = __import__(modpath, fromlist=[attr])
+				klass = getattr(module, attr)
+				add_safe_globals([klass])
+			except Exception:
+				pass
 	except Exception:
 		pass
+
+	# Force torch.load to use weights_only=False to avoid repeated allowlisting issues
 	try:
-		from TTS.tts.models.xtts import XttsAudioConfig  # type: ignore
-		add_safe_globals([XttsAudioConfig])
+		import torch
+		_orig_torch_load = torch.load
+		def _patched_torch_load(*args, **kwargs):
+			kwargs["weights_only"] = False
+			return _orig_torch_load(*args, **kwargs)
+		torch.load = _patched_torch_load
 	except Exception:
 		pass
-	# Shared configs (module path differs by version); import what exists
-	for modpath, attr in [
-		("TTS.config.shared_configs", "BaseDatasetConfig"),
-		("TTS.tts.configs.shared_configs", "BaseDatasetConfig"),
-		("TTS.config.shared_configs", "BaseAudioConfig"),
-		("TTS.tts.configs.shared_configs", "BaseAudioConfig"),
-		("TTS.config.shared_configs", "CharactersConfig"),
-		("TTS.tts.configs.shared_configs", "CharactersConfig"),
-	]:
-		try:
-			module = __import__(modpath, fromlist=[attr])
-			klass = getattr(module, attr)
-			add_safe_globals([klass])
-		except Exception:
-			pass
-except Exception:
-	pass
 
-# Force torch.load to use weights_only=False to avoid repeated allowlisting issues
-try:
-	import torch
-	_orig_torch_load = torch.load
-	def _patched_torch_load(*args, **kwargs):
-		kwargs["weights_only"] = False
-		return _orig_torch_load(*args, **kwargs)
-	torch.load = _patched_torch_load
-except Exception:
-	pass
 
-#tts = TTS(model_name="xtts")  # or "xtts_v2.0.2"
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2")
+def _warm_up() -> None:
+	"""Run one short synthesis so kernels, JIT paths and allocator pools are primed before traffic.
+
+	Uses XTTS_WARMUP_VOICE (a voice_id) or the first indexed voice; skipped when there is none.
+	"""
+	voice_id = os.getenv("XTTS_WARMUP_VOICE") or next(iter(voice_store.ids()), None)
+	ref_path = voice_store.get(voice_id) if voice_id else None
+	if not ref_path:
+		print("[startup] warm-up skipped: no reference voice")
+		return
+	text = os.getenv("XTTS_WARMUP_TEXT", "Hello, this is a short warm-up sentence.")
+	with _inference_mode():
+		_synthesize_wav(text, voice_id, ref_path, os.getenv("XTTS_WARMUP_LANGUAGE", "en"))
+
+
+def _load_model() -> None:
+	global tts
+	try:
+		started = time.perf_counter()
+		from TTS.api import TTS  # Coqui TTS; importing it alone takes seconds
+		_startup_phase("import", started)
+		started = time.perf_counter()
+		_allow_xtts_globals()
+		_startup_phase("safe_globals", started)
+		# First run downloads the model from Hugging Face
+		started = time.perf_counter()
+		tts = TTS(model_name=XTTS_MODEL_NAME)
+		_startup_phase("model_load", started)
+		if os.getenv("XTTS_WARMUP", "1").lower() not in ["0", "false", "no"]:
+			with _startup_lock:
+				_startup["state"] = "warming"
+			started = time.perf_counter()
+			try:
+				_warm_up()
+			except Exception:
+				# A failed warm-up only costs first-request latency; the model itself is usable
+				print("[startup] warm-up failed:\n" + traceback.format_exc())
+			_startup_phase("warmup", started)
+		_startup_phase("total", _PROCESS_STARTED)
+		with _startup_lock:
+			_startup["state"] = "ready"
+		print(f"[startup] ready: {_startup['phases']}")
+	except Exception as e:
+		print("[startup] model load failed:\n" + traceback.format_exc())
+		with _startup_lock:
+			_startup["state"] = "failed"
+			_startup["error"] = str(e)
+
 
-# In-memory voice registry: voice_id -> path to uploaded reference audio
-VOICE_DIR = os.path.abspath("voices")
+def _model_ready() -> bool:
+	return _startup["state"] == "ready"
+
+VOICE_DIR = os.path.abspath(os.getenv("XTTS_VOICE_DIR", "voices"))
 os.makedirs(VOICE_DIR, exist_ok=True)
-voice_store: Dict[str, str] = {}
+
+# Reference audio extensions recognised when scanning VOICE_DIR; the normalized .wav is preferred
+_VOICE_EXTS = (".wav", ".flac", ".mp3", ".m4a", ".ogg", ".webm")
+_VOICE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class VoiceRegistry:
+	"""voice_id -> reference audio path, rebuilt from VOICE_DIR so cloned voices survive restarts.
+
+	VOICE_DIR itself is the persistent index: each voice is stored as {voice_id}.wav (normalized) or
+	{voice_id}{ext} (raw upload), plus an optional {voice_id}.latents.pt. Startup only lists file
+	names (os.scandir, no stat or decoding). Voices missing from the index, e.g. cloned by another
+	instance sharing the directory, are looked up on disk on first use. Conditioning latents load
+	lazily through the bounded LRU in _get_latents.
+	"""
+
+	def __init__(self, directory: str) -> None:
+		self.directory = directory
+		self._paths: Dict[str, str] = {}
+		self._lock = threading.Lock()
+		self.scan_seconds = 0.0
+
+	def scan(self) -> int:
+		started = time.perf_counter()
+		found: Dict[str, str] = {}
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				stem, ext = os.path.splitext(entry.name)
+				if ext.lower() not in _VOICE_EXTS or "." in stem or not _VOICE_ID_RE.match(stem):
+					continue
+				current = found.get(stem)
+				if current is None or ext.lower() == ".wav":
+					found[stem] = entry.path
+		with self._lock:
+			self._paths = found
+		self.scan_seconds = time.perf_counter() - started
+		return len(found)
+
+	def add(self, voice_id: str, path: str) -> None:
+		with self._lock:
+			self._paths[voice_id] = path
+
+	def get(self, voice_id: str) -> str | None:
+		with self._lock:
+			path = self._paths.get(voice_id)
+		if path is not None and os.path.exists(path):
+			return path
+		path = self._find(voice_id)
+		with self._lock:
+			if path is None:
+				self._paths.pop(voice_id, None)
+			else:
+				self._paths[voice_id] = path
+		return path
+
+	def _find(self, voice_id: str) -> str | None:
+		if not _VOICE_ID_RE.match(voice_id or ""):
+			return None
+		for ext in _VOICE_EXTS:
+			path = os.path.join(self.directory, f"{voice_id}{ext}")
+			if os.path.exists(path):
+				return path
+		return None
+
+	def ids(self) -> List[str]:
+		with self._lock:
+			return list(self._paths)
+
+	def __len__(self) -> int:
+		return len(self._paths)
+
+
+voice_store = VoiceRegistry(VOICE_DIR)
+print(f"[voices] indexed {voice_store.scan()} voices from {VOICE_DIR} in {voice_store.scan_seconds * 1000:.1f} ms")
+
+# Speaker conditioning cache: voice_id -> (gpt_cond_latent, speaker_embedding).
+# Latents are persisted next to the normalized WAV and kept in a bounded LRU.
+LATENT_CACHE_SIZE = int(os.getenv("XTTS_LATENT_CACHE_SIZE", "64"))
+_latent_cache: "OrderedDict[str, Tuple[Any, Any]]" = OrderedDict()
+_latent_lock = threading.Lock()
+
+# The single global model is not thread-safe: every call into it (latents and synthesis) holds this lock
+_model_lock = threading.RLock()
+
+OUTPUT_SR = DEFAULT_SR
+# Streaming mode splits text into chunks no longer than this (sentences, then clauses)
+STREAM_MAX_CHARS = int(os.getenv("XTTS_STREAM_MAX_CHARS", "160"))
 
 
 class TTSRequest(BaseModel):
 	text: str
 	voice_id: str
 	language: str | None = "en"
+	# Output format for /tts: wav (default), pcm (raw PCM16 at OUTPUT_SR), ogg (Opus) or mp3; else negotiated from Accept
+	format: str | None = None
+
+
+@functools.lru_cache(maxsize=16)
+def _resampler(orig_freq: int, new_freq: int):
+	"""Resample transforms are cached per rate pair; building one computes a windowed-sinc kernel."""
+	return torchaudio.transforms.Resample(orig_freq=orig_freq, new_freq=new_freq)
 
 
 def _normalize_voice_to_wav(src_path: str, dst_path: str, target_sr: int = 24000, max_seconds: float = 10.0) -> str:
@@ -90,7 +267,12 @@ def _normalize_voice_to_wav(src_path: str, dst_path: str, target_sr: int = 24000
 	if not _TORCHAUDIO:
 		return src_path
 	try:
-		waveform, sample_rate = torchaudio.load(src_path)
+		# Decode only the first max_seconds of a 1–3 minute sample when the container reports its rate
+		try:
+			source_sr = torchaudio.info(src_path).sample_rate
+			waveform, sample_rate = torchaudio.load(src_path, num_frames=int(max_seconds * source_sr))
+		except Exception:
+			waveform, sample_rate = torchaudio.load(src_path)
 		# Convert to mono
 		if waveform.dim() == 2 and waveform.size(0) > 1:
 			waveform = waveform.mean(dim=0, keepdim=True)
@@ -100,59 +282,453 @@ def _normalize_voice_to_wav(src_path: str, dst_path: str, target_sr: int = 24000
 			waveform = waveform[:, :max_samples]
 		# Resample if needed
 		if sample_rate != target_sr:
-			resampler = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=target_sr)
-			waveform = resampler(waveform)
+			waveform = _resampler(sample_rate, target_sr)(waveform)
 		# Write to WAV
 		wav_np = waveform.squeeze(0).detach().cpu().numpy()
 		with open(dst_path, 'wb') as f:
-			sf.write(f, wav_np, target_sr, format='WAV')
+			sf.write(f, wav_np, target_sr, format='WAV', subtype='PCM_16')
 		return dst_path
 	except Exception:
 		print("[voice-normalize] failed:\n" + traceback.format_exc())
 		return src_path
 
 
+def _content_hash(data: bytes) -> str:
+	return hashlib.sha256(data).hexdigest()
+
+
+def _hash_path(digest: str) -> str:
+	# Content-hash index lives beside the voices (VOICE_DIR/.hashes/<sha256> holds the voice_id)
+	return os.path.join(VOICE_DIR, ".hashes", digest)
+
+
+def _voice_for_hash(digest: str) -> Optional[str]:
+	try:
+		with open(_hash_path(digest), "r", encoding="utf-8") as f:
+			voice_id = f.read().strip()
+	except OSError:
+		return None
+	return voice_id if voice_id and voice_store.get(voice_id) else None
+
+
+def _remember_hash(digest: str, voice_id: str) -> None:
+	path = _hash_path(digest)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+	with open(tmp, "w", encoding="utf-8") as f:
+		f.write(voice_id)
+	os.replace(tmp, path)
+
+
+def ingest_voice(data: bytes, ext: str = ".wav", digest: Optional[str] = None) -> Tuple[str, str, bool]:
+	"""Store and normalize a reference sample unless identical bytes were ingested before.
+
+	Returns (voice_id, reference path, deduplicated). Conditioning latents are not computed here.
+	"""
+	digest = digest or _content_hash(data)
+	existing = _voice_for_hash(digest)
+	if existing:
+		return existing, voice_store.get(existing), True
+	voice_id = str(uuid.uuid4())
+	raw_path = os.path.join(VOICE_DIR, f"{voice_id}{ext}")
+	norm_wav_path = os.path.join(VOICE_DIR, f"{voice_id}.wav")
+	with open(raw_path, "wb") as f:
+		f.write(data)
+	final_path = _normalize_voice_to_wav(raw_path, norm_wav_path)
+	voice_store.add(voice_id, final_path)
+	_remember_hash(digest, voice_id)
+	return voice_id, final_path, False
+
+
+def _latents_path(voice_id: str) -> str:
+	return os.path.join(VOICE_DIR, f"{voice_id}.latents.pt")
+
+
+def _xtts_model():
+	"""Return the underlying Xtts model if it exposes latent-based inference, else None."""
+	model = getattr(getattr(tts, "synthesizer", None), "tts_model", None)
+	if model is None or not hasattr(model, "get_conditioning_latents") or not hasattr(model, "inference"):
+		return None
+	return model
+
+
+def _cache_put(voice_id: str, latents: Tuple[Any, Any]) -> None:
+	with _latent_lock:
+		_latent_cache[voice_id] = latents
+		_latent_cache.move_to_end(voice_id)
+		while len(_latent_cache) > max(1, LATENT_CACHE_SIZE):
+			_latent_cache.popitem(last=False)
+
+
+def _compute_latents(voice_id: str, ref_path: str) -> Tuple[Any, Any] | None:
+	"""Encode the reference audio once and persist the conditioning latents to VOICE_DIR."""
+	model = _xtts_model()
+	if model is None:
+		return None
+	try:
+		with _model_lock:
+			gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(audio_path=[ref_path])
+		torch.save({"gpt_cond_latent": gpt_cond_latent, "speaker_embedding": speaker_embedding}, _latents_path(voice_id))
+		_cache_put(voice_id, (gpt_cond_latent, speaker_embedding))
+		return gpt_cond_latent, speaker_embedding
+	except Exception:
+		print("[latents] compute failed:\n" + traceback.format_exc())
+		return None
+
+
+def _get_latents(voice_id: str, ref_path: str) -> Tuple[Any, Any] | None:
+	"""Memory LRU first, then the on-disk latents file, then recompute from the reference WAV."""
+	with _latent_lock:
+		cached = _latent_cache.get(voice_id)
+		if cached is not None:
+			_latent_cache.move_to_end(voice_id)
+			return cached
+	path = _latents_path(voice_id)
+	if os.path.exists(path):
+		try:
+			blob = torch.load(path, map_location="cpu")
+			latents = (blob["gpt_cond_latent"], blob["speaker_embedding"])
+			_cache_put(voice_id, latents)
+			return latents
+		except Exception:
+			print("[latents] load failed:\n" + traceback.format_exc())
+	return _compute_latents(voice_id, ref_path)
+
+
+def _synthesize_wav(text: str, voice_id: str, ref_path: str, language: str):
+	"""Run XTTS from cached conditioning latents; fall back to speaker_wav when unavailable.
+
+	Inference is serialized on _model_lock, so extra XTTS_WORKERS only overlap latent loading and
+	result hand-off with it; running inference in parallel needs one model (process) per worker.
+	"""
+	model = _xtts_model()
+	latents = _get_latents(voice_id, ref_path) if model is not None else None
+	with _model_lock:
+		if latents is None:
+			return tts.tts(text=text, speaker_wav=ref_path, language=language)
+		gpt_cond_latent, speaker_embedding = latents
+		# tts.tts() splits text into sentences; inference() does not by default, and truncates past
+		# XTTS's per-language character limit (250 for English)
+		out = model.inference(text, language, gpt_cond_latent, speaker_embedding, enable_text_splitting=True)
+	return out["wav"]
+
+
+class _TTSJob:
+	__slots__ = ("text", "voice_id", "ref_path", "language", "future", "enqueued_at", "timer")
+
+	def __init__(self, text: str, voice_id: str, ref_path: str, language: str) -> None:
+		self.text = text
+		self.voice_id = voice_id
+		self.ref_path = ref_path
+		self.language = language
+		self.future: Future = Future()
+		self.enqueued_at = time.perf_counter()
+		# The submitting request's timer, so queue wait and inference show up in its Server-Timing
+		self.timer = current_timer()
+
+
+class QueueFullError(Exception):
+	def __init__(self, retry_after: int) -> None:
+		super().__init__("synthesis queue is full")
+		self.retry_after = retry_after
+
+
+class SynthesisScheduler:
+	"""Bounded work queue in front of the model for /tts and /tts/stream jobs.
+
+	Jobs run one at a time per worker thread, so inference never blocks the event loop, and
+	admission is bounded: when the queue is full, submit() raises QueueFullError instead of letting
+	requests pile up. XTTS has no batched generate API, so jobs are not grouped; a worker takes the
+	next job as soon as it is free.
+
+	Environment variables:
+	- XTTS_WORKERS: worker threads pulling jobs (default: 1); model calls stay serialized, see _synthesize_wav
+	- XTTS_MAX_QUEUE: max queued jobs before rejecting with 429 (default: 64)
+	"""
+
+	def __init__(self, workers: int = 1, max_queue: int = 64) -> None:
+		self.workers = max(1, workers)
+		self.max_queue = max(1, max_queue)
+		self._queue: "queue.Queue[_TTSJob]" = queue.Queue(maxsize=self.max_queue)
+		self._stats_lock = threading.Lock()
+		self._active = 0
+		self._latencies: "deque[float]" = deque(maxlen=512)
+		self.rejected = 0
+		self.queue_wait = Histogram("xtts_queue_wait_seconds", "Time jobs wait in the queue before inference.", [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10])
+		self._threads = [
+			threading.Thread(target=self._loop, name=f"xtts-worker-{i}", daemon=True)
+			for i in range(self.workers)
+		]
+		for t in self._threads:
+			t.start()
+
+	def submit(self, text: str, voice_id: str, ref_path: str, language: str, block: bool = False) -> Future:
+		"""Queue a job; with block=False (new requests) a full queue raises QueueFullError."""
+		job = _TTSJob(text, voice_id, ref_path, language)
+		try:
+			self._queue.put(job, block=block)
+		except queue.Full:
+			with self._stats_lock:
+				self.rejected += 1
+			raise QueueFullError(self.retry_after())
+		return job.future
+
+	def has_capacity(self) -> bool:
+		return not self._queue.full()
+
+	def depth(self) -> int:
+		return self._queue.qsize()
+
+	def retry_after(self) -> int:
+		"""Seconds until the current backlog is expected to drain, from rolling per-job latency."""
+		mean = self._mean_latency() or 1.0
+		return max(1, int(round(mean * self.depth() / self.workers)))
+
+	def _mean_latency(self) -> float:
+		with self._stats_lock:
+			if not self._latencies:
+				return 0.0
+			return sum(self._latencies) / len(self._latencies)
+
+	def _loop(self) -> None:
+		while True:
+			job = self._queue.get()
+			with self._stats_lock:
+				self._active += 1
+			try:
+				self._run(job)
+			finally:
+				with self._stats_lock:
+					self._active -= 1
+
+	def _run(self, job: _TTSJob) -> None:
+		started = time.perf_counter()
+		self.queue_wait.observe(started - job.enqueued_at)
+		if job.timer is not None:
+			job.timer.add("queue_wait", started - job.enqueued_at)
+		if not job.future.set_running_or_notify_cancel():
+			return
+		try:
+			with _inference_mode():
+				job.future.set_result(_synthesize_wav(job.text, job.voice_id, job.ref_path, job.language))
+		except Exception as e:
+			job.future.set_exception(e)
+		finished = time.perf_counter()
+		metrics.stage_seconds.observe(finished - started, "inference")
+		if job.timer is not None:
+			job.timer.add("inference", finished - started)
+		with self._stats_lock:
+			self._latencies.append(finished - job.enqueued_at)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._stats_lock:
+			window = sorted(self._latencies)
+			active = self._active
+			rejected = self.rejected
+
+		def pct(p: float) -> float:
+			if not window:
+				return 0.0
+			return round(window[min(len(window) - 1, int(p * len(window)))], 4)
+
+		return {
+			"workers": self.workers,
+			"active_workers": active,
+			"queue_depth": self.depth(),
+			"queue_capacity": self.max_queue,
+			"rejected": rejected,
+			"latency_seconds": {
+				"samples": len(window),
+				"mean": round(sum(window) / len(window), 4) if window else 0.0,
+				"p50": pct(0.50),
+				"p95": pct(0.95),
+				"p99": pct(0.99),
+			},
+			"queue_wait_seconds": self.queue_wait.snapshot(),
+		}
+
+
+def _inference_mode():
+	try:
+		return torch.inference_mode()
+	except Exception:
+		return contextlib.nullcontext()
+
+
+scheduler = SynthesisScheduler(
+	workers=int(os.getenv("XTTS_WORKERS", "1")),
+	max_queue=int(os.getenv("XTTS_MAX_QUEUE", "64")),
+)
+metrics.register(scheduler.queue_wait)
+metrics.gauge("queue_depth", "Synthesis jobs waiting for a worker.", scheduler.depth)
+metrics.gauge("voices", "Voices in the registry.", lambda: len(voice_store))
+metrics.gauge("cached_latents", "Speaker conditioning latents held in memory.", lambda: len(_latent_cache))
+metrics.gauge("ready", "1 once the model is loaded and warmed up.", lambda: 1 if _model_ready() else 0)
+
+
+def _busy_response(retry_after: int) -> JSONResponse:
+	return JSONResponse(
+		{"error": "server busy, retry later"},
+		status_code=429,
+		headers={"Retry-After": str(retry_after)},
+	)
+
+
+def _not_ready_response() -> JSONResponse:
+	# 503 (not 429) so load balancers treat the instance as unavailable rather than busy
+	return JSONResponse(
+		{"error": f"model {_startup['state']}", "state": _startup["state"]},
+		status_code=503,
+		headers={"Retry-After": "5"},
+	)
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+")
+_CLAUSE_RE = re.compile(r"(?<=[,:])\s+")
+
+
+def _split_text(text: str, max_chars: int = STREAM_MAX_CHARS) -> List[str]:
+	"""Split text into sentences, breaking overly long sentences further at clause boundaries."""
+	chunks: List[str] = []
+	for sentence in _SENTENCE_RE.split(text.strip()):
+		sentence = sentence.strip()
+		if not sentence:
+			continue
+		if len(sentence) <= max_chars:
+			chunks.append(sentence)
+			continue
+		current = ""
+		for clause in _CLAUSE_RE.split(sentence):
+			if current and len(current) + len(clause) + 1 > max_chars:
+				chunks.append(current)
+				current = clause
+			else:
+				current = f"{current} {clause}".strip()
+		if current:
+			chunks.append(current)
+	return chunks
+
+
+def _pcm16(wav) -> bytes:
+	samples = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+	return (samples * 32767.0).astype("<i2").tobytes()
+
+
+def _encode_output(wav, fmt: str) -> bytes:
+	"""Encode synthesized float samples once: PCM16 bytes are the payload for pcm/wav, the input for ogg/mp3."""
+	pcm = _pcm16(wav)
+	if fmt == "pcm":
+		return pcm
+	return encode_audio(wav_from_pcm(pcm, OUTPUT_SR), fmt)
+
+
+def _stream_chunks(chunks: List[str], first: Future, voice_id: str, ref_path: str, language: str) -> Iterator[bytes]:
+	yield streaming_wav_header(OUTPUT_SR)
+	pending = first
+	for i in range(len(chunks)):
+		try:
+			wav = pending.result()
+			# Already admitted: later chunks wait for queue space instead of being rejected
+			if i + 1 < len(chunks):
+				pending = scheduler.submit(chunks[i + 1], voice_id, ref_path, language, block=True)
+		except Exception:
+			# Headers are already sent; log and end the stream early
+			print("[synthesis-stream] error:\n" + traceback.format_exc())
+			return
+		yield _pcm16(wav)
+
+
 @app.post("/clone")
 async def clone(audio: UploadFile = File(...)):
 	"""Accept a 1–3 minute audio sample, save it, and return a voice_id.
 	We keep a normalized 10s mono 24kHz WAV for robust synthesis.
+	Re-uploading identical bytes returns the existing voice_id (deduplicated: true).
 	"""
-	voice_id = str(uuid.uuid4())
 	orig = audio.filename or "sample.wav"
 	_, ext = os.path.splitext(orig)
 	if not ext:
 		ext = ".wav"
-	raw_path = os.path.join(VOICE_DIR, f"{voice_id}{ext}")
-	norm_wav_path = os.path.join(VOICE_DIR, f"{voice_id}.wav")
 	data = await audio.read()
-	with open(raw_path, "wb") as f:
-		f.write(data)
-	final_path = _normalize_voice_to_wav(raw_path, norm_wav_path)
-	voice_store[voice_id] = final_path
-	return {"voice_id": voice_id, "voice_path": final_path}
+	# Disk I/O, decoding and latent computation are blocking; keep them off the event loop
+	voice_id, final_path, deduplicated = await run_in_threadpool(_store_voice, data, ext)
+	return {"voice_id": voice_id, "voice_path": final_path, "deduplicated": deduplicated}
+
+
+def _store_voice(data: bytes, ext: str) -> Tuple[str, str, bool]:
+	with metrics.stage("ingest"):
+		voice_id, final_path, deduplicated = ingest_voice(data, ext)
+	if not deduplicated:
+		with metrics.stage("latents"):
+			_compute_latents(voice_id, final_path)
+	return voice_id, final_path, deduplicated
 
 
 @app.post("/tts")
-async def synthesize(req: TTSRequest):
+async def synthesize(req: TTSRequest, request: Request):
+	if not _model_ready():
+		return _not_ready_response()
 	ref_path = voice_store.get(req.voice_id)
 	if not ref_path or not os.path.exists(ref_path):
-		return JSONResponse({"error": "invalid voice_id"}, status_code=400)
-	# Generate audio with XTTS v2 using the stored reference sample
+		# 404 lets a load-balancing client try another instance that holds this voice
+		return JSONResponse({"error": "invalid voice_id"}, status_code=404)
+	# Generate audio with XTTS v2 using the cached speaker conditioning
+	try:
+		future = scheduler.submit(req.text, req.voice_id, ref_path, req.language or "en")
+	except QueueFullError as e:
+		return _busy_response(e.retry_after)
 	try:
-		wav = tts.tts(
-			text=req.text,
-			speaker_wav=ref_path,
-			language=req.language or "en",
-		)
-		buf = io.BytesIO()
-		# XTTS typically outputs at 24000 Hz; 22050 is acceptable for playback
-		sf.write(buf, np.asarray(wav), 24000, format="WAV")
-		return Response(content=buf.getvalue(), media_type="audio/wav")
+		wav = await asyncio.wrap_future(future)
+		fmt = negotiate_format(req.format, request.headers.get("accept"))
+		# XTTS typically outputs at 24000 Hz; compressed encodes run off the event loop
+		with metrics.stage("encode"):
+			body = _encode_output(wav, fmt) if fmt in ("pcm", "wav") else await run_in_threadpool(_encode_output, wav, fmt)
+		return Response(content=body, media_type=audio_mime_type(fmt, OUTPUT_SR))
 	except Exception as e:
 		print("[synthesis] error:\n" + traceback.format_exc())
 		return JSONResponse({"error": f"synthesis failed: {e}"}, status_code=500)
 
 
+@app.post("/tts/stream")
+async def synthesize_stream(req: TTSRequest):
+	"""Sentence-chunked synthesis: a streaming WAV header followed by PCM16 audio per chunk."""
+	if not _model_ready():
+		return _not_ready_response()
+	ref_path = voice_store.get(req.voice_id)
+	if not ref_path or not os.path.exists(ref_path):
+		# 404 lets a load-balancing client try another instance that holds this voice
+		return JSONResponse({"error": "invalid voice_id"}, status_code=404)
+	chunks = _split_text(req.text)
+	if not chunks:
+		return JSONResponse({"error": "text is required"}, status_code=400)
+	language = req.language or "en"
+	try:
+		first = scheduler.submit(chunks[0], req.voice_id, ref_path, language)
+	except QueueFullError as e:
+		return _busy_response(e.retry_after)
+	# Sync generator: Starlette iterates it in a threadpool, so waiting on results doesn't block the loop
+	return StreamingResponse(
+		_stream_chunks(chunks, first, req.voice_id, ref_path, language),
+		media_type="audio/wav",
+	)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+	return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health():
-	return {"status": "ok", "voices": len(voice_store), "torchaudio": _TORCHAUDIO} 
\ No newline at end of file
+	"""200 once the model is loaded and warmed up; 503 while loading/warming or after a failed load."""
+	with _startup_lock:
+		startup = {"state": _startup["state"], "phases": dict(_startup["phases"]), "error": _startup["error"]}
+	body = {
+		"status": "ok" if startup["state"] == "ready" else startup["state"],
+		"startup": startup,
+		"voices": len(voice_store),
+		"voice_index_ms": round(voice_store.scan_seconds * 1000, 1),
+		"torchaudio": _TORCHAUDIO,
+		"cached_latents": len(_latent_cache),
+		"scheduler": scheduler.stats(),
+	}
+	return JSONResponse(body, status_code=200 if startup["state"] == "ready" else 503)